@@ -1,30 +1,63 @@
 from .fq import Fq
 from .fq2 import Fq2
+from .misc import wnaf,batch_inverse,FactoryType
+
+_point_cache = {} # 有限体のクラス => Pointのクラス
 
 def Point(ff):
-    class _Point:
+    """
+    座標が有限体ffの元である点のクラスを返す。
+    同じffに対しては同じクラスを返す。
+    """
+    if ff in _point_cache:
+        return _point_cache[ff]
+    
+    class _Point(metaclass=FactoryType):
         """
         楕円曲線上の点を表すクラス
+        
+        点は不変(immutable)でhash可能。(e.g. EC._fixedのキー)
         """
+        __slots__ = ("x","y")
+        
         def __init__(self,x,y):
             assert isinstance(x,self._ff) and isinstance(y,self._ff) 
-            self.x = x
-            self.y = y
+            _set_x(self,x)
+            _set_y(self,y)
             
+        def __setattr__(self,name,value):
+            raise AttributeError("point is immutable")
+
         def __str__(self):
             return "(%s,%s)"%(str(self.x),str(self.y))
 
         def __eq__(self,other):
-            assert isinstance(other,_Point)            
-            return self.x == other.x and self.y == other.y
+            if isinstance(other,_Point):
+                return self.x == other.x and self.y == other.y
+            return NotImplemented
         
         def __ne__(self,other):
             return not self == other
+
+        def __hash__(self):
+            return hash((self.x,self.y))
+
+        def __reduce__(self):
+            return self.__class__,(self.x,self.y)
         
+    _set_x = _Point.x.__set__ # __setattr__を経由せずにx,yを設定する。
+    _set_y = _Point.y.__set__
+
     point = _Point
     point._ff = ff
+    point._factory = Point
+    point._factory_args = (ff,)
+    _point_cache[ff] = point
     return point
     
+WNAF_WIDTH = 4 # EC.mulが使用するwNAFの窓の幅(デフォルト)
+FIXED_BASE_BUDGET = 1024 # FixedBaseのテーブルに保存する点の個数の上限(デフォルト)
+
 class EC:
     """
     楕円曲線: y^2 = x^3 + ax + b (ここでa,bは有限体の元)
@@ -38,6 +71,15 @@ class EC:
         self.b = b
         self.ff = ff # 有限体(Finite Field)
         self.point = Point(self.ff)
+        self._ext = None # Fq2上へ拡大した楕円曲線のキャッシュ。
+        self._fixed = {} # 点 => FixedBase(固定点スカラー倍の事前計算テーブル)
+        self.wnaf_width = WNAF_WIDTH # mulが使用するwNAFの窓の幅
+
+        # 有限体の1。Jacobian座標のZ座標として使用。
+        if self.ff.name() == "fq2":
+            self._one = self.ff.int_to_fq2(1)
+        else:
+            self._one = self.ff(1)
 
         assert isinstance(self.a,self.ff)
         assert isinstance(self.b,self.ff)
@@ -50,6 +92,26 @@ class EC:
 
     def __str__(self):
         return "E(y^2 = x^3 + %s*x + %s)/F_%s"%(str(self.a),str(self.b),self.ff.prime())
+
+    def __eq__(self,other):
+        """
+        パラメータ(a,b,ff)が等しい楕円曲線は等しいとみなす。
+        """
+        return isinstance(other,EC) and self.ff is other.ff and \
+            self.a == other.a and self.b == other.b
+
+    def __ne__(self,other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.a,self.b,self.ff))
+
+    def __reduce__(self):
+        """
+        pickleの際はパラメータ(a,b,ff)とwnaf_widthのみを保存する。
+        (キャッシュ(_ext,_fixed)は保存しない)
+        """
+        return EC,(self.a,self.b,self.ff),{"wnaf_width":self.wnaf_width}
     
     def on_curve(self,p):
         """
@@ -69,13 +131,14 @@ class EC:
     def double_and_add(self,n,p):
         """
         double-and-addアルゴリズムを使用して[n]Pを計算。
+        内部ではJacobian座標を使用し、最後に一度だけアフィン座標に戻す。
         
         @param n:int
         @param p:Point
         @return:Point
         """
         assert isinstance(n,int)
-        assert isinstance(p,(self.point,None))
+        assert isinstance(p,(self.point,type(None)))
 
         if p is None: return None
         
@@ -83,16 +146,172 @@ class EC:
             return None
         elif n < 0: # e.g. [-5]p => [5](-p)
             return self.double_and_add(-n,self.neg(p))
+
+        bits = "{:b}".format(n)
+        r = self._to_jacobian(p)
+        for b in bits[1:]:
+            r = self._jacobian_double(r)
+            if(b == '1'):
+                r = self._jacobian_add_mixed(r,p)
+
+        return self._to_affine(r)
+
+    def wnaf_mul(self,n,p,width=None):
+        """
+        wNAFを使用して[n]Pを計算。
+        -Pの計算は無料なので、符号付きの桁を使うことで加算の回数を減らせる。
+        P,[3]P,...,[2^(width-1)-1]Pをアフィン座標で事前計算し、
+        内部ではJacobian座標を使用する。
+        
+        @param n:int
+        @param p:Point
+        @param width:int 窓の幅(省略した場合はself.wnaf_width)
+        @return:Point
+        """
+        assert isinstance(n,int)
+        assert isinstance(p,(self.point,type(None)))
+        
+        if width is None:
+            width = self.wnaf_width
+        
+        if p is None or n == 0:
+            return None
+        elif n < 0:
+            return self.wnaf_mul(-n,self.neg(p),width)
+        
+        # odd[i] = [2i+1]p、Jacobian座標で計算して一度にアフィン座標へ変換する。
+        odd = [self._to_jacobian(p)]
+        if width > 2:
+            p2 = self._to_affine(self._jacobian_double(odd[0]))
+            for i in range(1,1 << (width - 2)):
+                odd.append(self._jacobian_add_mixed(odd[-1],p2))
+        odd = self._to_affine_batch(odd)
+        neg_odd = [self.neg(t) for t in odd]
         
-        q = p
         r = None
-        while(n > 0):
-            if(n & 1): # nが奇数の場合。
-                r = self.add(r,q)
-            q = self.add(q,q)
-            n >>= 1
+        for d in reversed(wnaf(n,width)):
+            r = self._jacobian_double(r)
+            if(d > 0):
+                r = self._jacobian_add_mixed(r,odd[d >> 1])
+            elif(d < 0):
+                r = self._jacobian_add_mixed(r,neg_odd[(-d) >> 1])
+                
+        return self._to_affine(r)
+    
+    def _to_jacobian(self,p):
+        """
+        アフィン座標の点p=(x,y)をJacobian座標(X,Y,Z) = (x,y,1)に変換。
+        Jacobian座標(X,Y,Z)はアフィン座標(X/Z^2,Y/Z^3)を表す。
+        単位元はアフィン座標と同様にNoneで表す。
+        
+        @param p:Point
+        @return:tuple
+        """
+        if p is None: return None
+        return (p.x,p.y,self._one)
+
+    def _to_affine(self,p):
+        """
+        Jacobian座標の点pをアフィン座標に変換。
+        この変換で一度だけ逆元を計算する。
+        
+        @param p:tuple
+        @return:Point
+        """
+        if p is None: return None
+        
+        X,Y,Z = p
+        z_inv = 1/Z
+        z_inv2 = z_inv*z_inv
+        return self.point(X*z_inv2,Y*z_inv2*z_inv)
 
-        return r
+    def _to_affine_batch(self,ps):
+        """
+        Jacobian座標の点のリストpsをまとめてアフィン座標に変換。
+        Montgomery's trick(misc.batch_inverse)により、逆元の計算は全体で一度だけ。
+        
+        @param ps:list
+        @return:list
+        """
+        z_invs = iter(batch_inverse([p[2] for p in ps if p is not None]))
+        result = []
+        for p in ps:
+            if p is None:
+                result.append(None)
+            else:
+                X,Y,_ = p
+                z_inv = next(z_invs)
+                z_inv2 = z_inv*z_inv
+                result.append(self.point(X*z_inv2,Y*z_inv2*z_inv))
+        return result
+
+    def _jacobian_double(self,p):
+        """
+        Jacobian座標の点pに対して[2]pを計算(逆元を使わない)。
+        a = 0の場合(i.e. y^2 = x^3 + b)は a*Z^4 の計算を省略する。
+        Ref: https://hyperelliptic.org/EFD/g1p/auto-shortw-jacobian.html (dbl-2007-bl)
+        
+        @param p:tuple
+        @return:tuple
+        """
+        if p is None: return None
+        
+        X,Y,Z = p
+        if(Y == 0): # 位数2の点。
+            return None
+        
+        XX = X*X
+        YY = Y*Y
+        YYYY = YY*YY
+        # 整数倍は加算で計算する。(2*Sは__rmul__で引数の検査を経由するため)
+        S = (X + YY).square() - XX - YYYY
+        S = S + S
+        M = XX + XX + XX
+        if(self.a != 0):
+            ZZ = Z*Z
+            M = M + self.a*(ZZ*ZZ)
+        Y8 = YYYY + YYYY
+        Y8 = Y8 + Y8
+        
+        X3 = M.square() - S - S
+        Y3 = M*(S - X3) - Y8 - Y8
+        Z3 = Y*Z
+        Z3 = Z3 + Z3
+        return (X3,Y3,Z3)
+
+    def _jacobian_add_mixed(self,p1,p2):
+        """
+        Jacobian座標の点p1とアフィン座標の点p2の和p1 + p2を
+        Jacobian座標で計算(逆元を使わない)。
+        Ref: https://hyperelliptic.org/EFD/g1p/auto-shortw-jacobian.html (madd-2004-hmv)
+        
+        @param p1:tuple
+        @param p2:Point
+        @return:tuple
+        """
+        if p2 is None: return p1
+        if p1 is None: return self._to_jacobian(p2)
+        
+        X1,Y1,Z1 = p1
+        Z1Z1 = Z1*Z1
+        U2 = p2.x*Z1Z1
+        S2 = p2.y*(Z1*Z1Z1)
+        H = U2 - X1
+        R = S2 - Y1
+        
+        if(H == 0):
+            if(R == 0): # p1 == p2
+                return self._jacobian_double(p1)
+            else:       # p1 == -p2
+                return None
+            
+        HH = H*H
+        HHH = H*HH
+        V = X1*HH
+        X3 = R.square() - HHH - V - V
+        Y3 = R*(V - X3) - Y1*HHH
+        Z3 = Z1*H
+        return (X3,Y3,Z3)
 
     def neg(self,p):
         """
@@ -127,8 +346,9 @@ class EC:
         elif(p1.x == p2.x and p1.y == -p2.y):
             return None
         elif(p1.x == p2.x and p1.y == p2.y):
-            numer = 3*(p1.x**2) + self.a
-            denom = 2*p1.y
+            xx = p1.x.square()
+            numer = xx + xx + xx + self.a
+            denom = p1.y + p1.y
         else:
             numer = p2.y - p1.y
             denom = p2.x - p1.x
@@ -154,6 +374,9 @@ class EC:
     def mul(self,n,p):
         """
         [n]p を計算。
+        wNAF(窓の幅はself.wnaf_width)を使用する。
+        double_and_addは比較用の参照実装として残している。
+        
         @param n:int
         @param p:Point
         @return:Point
@@ -161,7 +384,141 @@ class EC:
         assert isinstance(n,int)
         assert isinstance(p,(self.point,type(None)))
         
-        return self.double_and_add(n,p)
+        return self.wnaf_mul(n,p)
+    
+    def fixed_base(self,p,bits=None,budget=FIXED_BASE_BUDGET):
+        """
+        点pに対する固定点スカラー倍用のテーブル(FixedBase)を返す。
+        テーブルは(楕円曲線,点)ごとに一度だけ作成され、以後再利用される。
+        
+        @param p:Point
+        @param bits:int スカラーの最大ビット長(省略した場合はqのビット長+1)
+        @param budget:int テーブルに保存する点の個数の上限
+        @return:FixedBase
+        """
+        assert isinstance(p,self.point)
+        
+        if bits is None:
+            bits = self.modulo().bit_length() + 1
+        
+        table = self._fixed.get(p)
+        if table is None or table.bits < bits:
+            table = FixedBase(self,p,bits,budget=budget)
+            self._fixed[p] = table
+        return table
+    
+    def extension(self):
+        """
+        Fq上の楕円曲線を、同じ係数をもつFq2上の楕円曲線に拡大して返す。
+        既にFq2上の楕円曲線である場合は自分自身を返す。
+        結果はキャッシュされるため、持ち上げた点同士は常に演算可能。
+        
+        @return:EC
+        """
+        if self.ff.name() == "fq2":
+            return self
+        
+        if self._ext is None:
+            fq2 = Fq2(self.ff)
+            a = fq2.int_to_fq2(self.a.val())
+            b = fq2.int_to_fq2(self.b.val())
+            self._ext = EC(a,b,fq2)
+        return self._ext
+
+    def lift(self,p):
+        """
+        Fq上の点pをFq2上の楕円曲線self.extension()の点に埋め込む。
+        
+        @param p:Point
+        @return:Point
+        """
+        assert isinstance(p,(self.point,type(None)))
+
+        ext = self.extension()
+        if p is None or ext is self: return p
+        
+        x = ext.ff.int_to_fq2(p.x.val())
+        y = ext.ff.int_to_fq2(p.y.val())
+        return ext.point(x,y)
     
     def modulo(self):        
         return self.ff.modulo()
+
+
+class FixedBase:
+    """
+    固定された点pのスカラー倍[n]pを、事前計算テーブルを使って計算するクラス。
+    
+    nをwindowビットごとの桁 n = sum(d_i * 2^(window*i)) に分解し、
+    table[i][d] = [d*2^(window*i)]p (1 <= d < 2^window)
+    をアフィン座標で保存しておく。
+    [n]pは2倍算を一切行わずに、高々ceil(bits/window)回の加算で求まる。
+    """
+    def __init__(self,ec,p,bits,window=None,budget=FIXED_BASE_BUDGET):
+        """
+        @param ec:EC
+        @param p:Point
+        @param bits:int スカラーの最大ビット長
+        @param window:int 窓の幅(省略した場合はbudgetに収まる最大の幅)
+        @param budget:int テーブルに保存する点の個数の上限
+        """
+        assert isinstance(ec,EC)
+        assert isinstance(p,ec.point)
+        assert isinstance(bits,int) and bits > 0
+        
+        if window is None:
+            window = 1
+            while window < 8 and FixedBase._size(bits,window + 1) <= budget:
+                window += 1
+        assert isinstance(window,int) and window > 0
+        
+        self.ec = ec
+        self.p = p
+        self.window = window
+        self.rows = -(-bits//window)
+        self.bits = self.rows*window
+        
+        # 各行をJacobian座標で計算し、まとめてアフィン座標に変換する。(逆元は一行に一度)
+        self.table = []
+        base = p # base = [2^(window*i)]p
+        for i in range(self.rows):
+            row = [ec._to_jacobian(base)]
+            for d in range(2,(1 << window) + 1):
+                row.append(ec._jacobian_add_mixed(row[-1],base))
+            row = ec._to_affine_batch(row)
+            base = row.pop() # [2^window]base
+            self.table.append([None] + row)
+            
+    @staticmethod
+    def _size(bits,window):
+        return -(-bits//window)*((1 << window) - 1)
+        
+    def size(self):
+        """
+        テーブルに保存されている点の個数を返す。
+        @return:int
+        """
+        return FixedBase._size(self.bits,self.window)
+        
+    def mul(self,n):
+        """
+        [n]p を計算。
+        @param n:int
+        @return:Point
+        """
+        assert isinstance(n,int)
+
+        if n < 0:
+            return self.ec.neg(self.mul(-n))
+        elif n >> self.bits: # テーブルの範囲外。
+            return self.ec.mul(n,self.p)
+        
+        mask = (1 << self.window) - 1
+        r = None
+        for row in self.table:
+            d = n & mask
+            if d:
+                r = self.ec._jacobian_add_mixed(r,row[d])
+            n >>= self.window
+            
+        return self.ec._to_affine(r)
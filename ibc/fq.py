@@ -1,117 +1,118 @@
-from .misc import sq_and_mul_fq,inv    
+from .misc import sq_and_mul_fq,inv,FactoryType
 from .prime import is_prime
 
+_fq_cache = {} # q => Fqのクラス
+
 def Fq(q):
-    class _Fq:
+    """
+    位数qの有限体のクラスを返す。
+    同じqに対しては同じクラスを返す。(素数判定も初回のみ)
+    
+    @param q:int 素数
+    @return: Fqのクラス
+    """
+    if q in _fq_cache:
+        return _fq_cache[q]
+    
+    class _Fq(metaclass=FactoryType):
         """
         qを素数とする有限体{0,1,...,p-1}を表すクラス
+        
+        元は不変(immutable)でhash可能。(hash値は対応する整数と一致する)
+        演算子は引数を検査するが、内部では検査を省略した_makeを使用する。
         """
+        __slots__ = ("_n",)
         
         def __init__(self,n):
             assert isinstance(n,(_Fq,int))
             
             if isinstance(n,_Fq):
-                self._n = n._n
+                _set(self,n._n)
             else:
-                self._n = n % self._q
+                _set(self,n % q)
         
+        @staticmethod
+        def _make(n):
+            """
+            mod qで還元された整数nから、検査をせずに元を生成する。(内部用)
+            """
+            z = _new(_Fq)
+            _set(z,n)
+            return z
+
+        def __setattr__(self,name,value):
+            raise AttributeError("fq is immutable")
+
         def __str__(self):
             return str(self._n)
     
         def __repr__(self):
             return str(self._n)
         
+        def __hash__(self):
+            return hash(self._n)
+        
         def __add__(self,other):
-            assert isinstance(other,(_Fq,int))
-            if isinstance(other,int):
-                return _Fq(self._n + other)
-            else:
-                return _Fq(self._n + other._n)
+            if type(other) is _Fq:
+                return _make((self._n + other._n) % q)
+            assert isinstance(other,int)
+            return _make((self._n + other) % q)
             
         def __radd__(self,other):
             return self + other
 
-        def __iadd__(self,other):
-            assert isinstance(other,(_Fq,int))
-            if isinstance(other,int):
-                self._n = (self._n + other) % self._q
-            else:
-                self._n = (self._n + other._n) % self._q
-
-            return self
-        
         def __sub__(self,other):
-            assert isinstance(other,(_Fq,int))
-            if isinstance(other,int):
-                return _Fq(self._n - other)
-            else:
-                return _Fq(self._n - other._n)
-
-        def __isub__(self,other):
-            assert isinstance(other,(_Fq,int))
-            if isinstance(other,int):
-                self._n = (self._n - other) % self._q
-            else:
-                self._n = (self._n - other._n) % self._q
+            if type(other) is _Fq:
+                return _make((self._n - other._n) % q)
+            assert isinstance(other,int)
+            return _make((self._n - other) % q)
 
-            return self
+        def __rsub__(self,other):
+            assert isinstance(other,int)
+            return _make((other - self._n) % q)
         
         def __mul__(self,other):
-            assert isinstance(other,(_Fq,int))
-            if isinstance(other,int):
-                return _Fq(self._n*other)
-            else:
-                return _Fq(self._n*other._n)
+            if type(other) is _Fq:
+                return _make(self._n*other._n % q)
+            assert isinstance(other,int)
+            return _make(self._n*other % q)
             
         def __rmul__(self,other):
             return self*other
 
-        def __imul__(self,other):
-            assert isinstance(other,(_Fq,int))
-            if isinstance(other,int):
-                self._n = (self._n*other) % self._q
-            else:
-                self._n = (self._n*other._n) % self._q
-
-            return self
-        
         def __truediv__(self,other):
-            assert isinstance(other,(_Fq,int))
-            if isinstance(other,int):
-                return _Fq(self._n*inv(other,self._q))
-            else:
-                return _Fq(self._n*inv(other._n,self._q))
+            if type(other) is _Fq:
+                return _make(self._n*inv(other._n,q) % q)
+            assert isinstance(other,int)
+            return _make(self._n*inv(other % q,q) % q)
             
         def __rtruediv__(self,other):
             assert isinstance(other,int)
-            return _Fq(other)/self
-        
-        def __idiv__(self,other):
-            assert isinstance(other,(_Fq,int))
-            if isinstance(other,int):
-                self._n = (self._n*inv(other,self._q)) % self._q
-            else:
-                self._n = (self._n*inv(other._n,self._q)) % self._q
-
-            return self
+            return _make(other*inv(self._n,q) % q)
         
         def __pow__(self,e):
             r = sq_and_mul_fq(self,e)
             return r
 
         def __neg__(self):
-            return _Fq(-self._n)
+            return _make(-self._n % q)
         
         def __eq__(self,other):
-            assert isinstance(other,(_Fq,int))
-            if isinstance(other,int):
-                return self._n == other
-            else:
+            if type(other) is _Fq:
                 return self._n == other._n
+            elif isinstance(other,int):
+                return self._n == other
+            return NotImplemented
             
         def __ne__(self,other):
             return not self == other
-        
+
+        def __reduce__(self):
+            return _Fq,(self._n,)
+
+        def square(self):
+            return _make(self._n*self._n % q)
+
         def val(self):
             return self._n
 
@@ -128,7 +129,13 @@ def Fq(q):
             return fq._q
         
     assert is_prime(q)
+    _new = object.__new__
+    _set = _Fq._n.__set__ # __setattr__を経由せずに_nを設定する。
+    _make = _Fq._make
     fq = _Fq
     fq._q = q
     fq._name = "fq"
+    fq._factory = Fq
+    fq._factory_args = (q,)
+    _fq_cache[q] = fq
     return fq
@@ -2,8 +2,10 @@
 Ref: https://crypto.stanford.edu/pbc/thesis.pdf p77.
 """
 
+import sys
+
 from .fq import Fq
-from .misc import sq_and_mul_fq
+from .misc import sq_and_mul_fq,wnaf,lucas_sequence,inv,FactoryType
 
 def _int_to_fq2(fq2,n):
     """
@@ -14,32 +16,52 @@ def _int_to_fq2(fq2,n):
     assert isinstance(n,int)
     return fq2(-n,-n)
 
-def _fq_to_fq2(fq2,p):
+def _mul_ints(a1,b1,a2,b2):
     """
-    クラスfqをクラスfq2に変換。
-    p = fq(n) => fq2(-n,-n)
+    Fq2の元(a1,b1)と(a2,b2)の積を、mod qの還元をせずに整数のまま計算する。
+    (a1,b1) = (x1,y1)、(a2,b2) = (x2,y2)とすると、
+    (x1,y1)*(x2,y2) = (y1*y2 - x1*y2 - y1*x2,x1*x2 - x1*y2 - y1*x2)。
+    Karatsuba法により d = (x1 - y1)*(x2 - y2)とすると、
+    (x1,y1)*(x2,y2) = (d - x1*x2,d - y1*y2)となり、乗算は3回で済む。
+    
+    @return: (a,b) = (int,int)
     """
-    assert fq2.name() == "fq2"
-    assert p.name() == "fq"
+    t1 = a1*a2
+    t2 = b1*b2
+    d = (a1 - b1)*(a2 - b2)
+    return d - t1,d - t2
+
+def _square_ints(a,b):
+    """
+    Fq2の元(a,b)の2乗を、mod qの還元をせずに整数のまま計算する。
+    (x,y)^2 = (y*(y - 2x),x*(x - 2y))なので、乗算は2回で済む。
     
-    n = p.val()
-    return fq2(-n,-n)
+    @return: (a,b) = (int,int)
+    """
+    return b*(b - 2*a),a*(a - 2*b)
 
-def _mul_tuple(p1,p2):
+def _lin_comb(fq2,terms,c=None):
     """
-    fq2クラスであるp1とp2の積を計算。    
-    戻り値はfqクラスのタプルであることに注意。
+    Fq2の元の積の和 sum(u*v) + c を計算。
+    途中の値は整数のまま計算し(_mul_ints)、各座標で一回だけmod qを取る。
     
-    @param p1:Fq2
-    @param p2:Fq2
-    @return: (a,b) = (Fq,Fq)
-    """    
-    assert p1.name() == "fq2"
-    assert p2.name() == "fq2"
+    @param fq2:
+    @param terms:(Fq2,Fq2)のリスト
+    @param c:Fq2 or None
+    @return: Fq2
+    """
+    assert fq2.name() == "fq2"
     
-    a = p1.y()*p2.y() - p1.x()*p2.y() - p1.y()*p2.x()
-    b = p1.x()*p2.x() - p1.x()*p2.y() - p1.y()*p2.x()
-    return a,b
+    a = b = 0
+    for u,v in terms:
+        ta,tb = _mul_ints(u._a,u._b,v._a,v._b)
+        a += ta
+        b += tb
+    if c is not None:
+        a += c._a
+        b += c._b
+    q = fq2._q
+    return fq2._make(a % q,b % q)
 
 def _mul_fq2(fq2,p1,p2):
     """
@@ -54,160 +76,181 @@ def _mul_fq2(fq2,p1,p2):
     assert p1.name() == "fq2"
     assert p2.name() == "fq2"
     
-    (a,b) = _mul_tuple(p1,p2)
-    return fq2(a,b)
+    q = fq2._q
+    a,b = _mul_ints(p1._a,p1._b,p2._a,p2._b)
+    return fq2._make(a % q,b % q)
 
 def _inv_fq2(fq2,p):
     """
     1/pを計算。
+    p = (a,b)のノルム N = p*p^q = a^2 - ab + b^2 はFqの元なので、
+    1/p = p^q/N = (b/N,a/N)。Fqの逆元は一回で済む。
     
     @param fq2:
     @param p:Fq2
     """
     assert fq2.name() == "fq2"
     assert p.name() == "fq2"
-    assert p.x() != 0 or p.y() != 0
+    assert p._a != 0 or p._b != 0
     
-    if p.x() != 0:
-        tmp = p.y()/p.x()
-        denom = p.y()*tmp + p.x() - p.y()
-        b = 1/denom
-        a = tmp*b
-    else: # p1.y != 0
-        tmp = p.x()/p.y()
-        denom = p.y() - (p.y() - p.x())*tmp
-        a = 1/denom
-        b = tmp*a
-
-    return fq2(a,b)
+    q = fq2._q
+    a,b = p._a,p._b
+    n = inv((a*a - a*b + b*b) % q,q)
+    return fq2._make(b*n % q,a*n % q)
+
+_fq2_cache = {} # Fqのクラス => Fq2のクラス
 
 def Fq2(fq):
+    """
+    Fqの拡大体Fq2のクラスを返す。
+    同じFqのクラスに対しては同じクラスを返す。
     
-    class _Fq2:
+    @param fq:Fqのクラス
+    @return: Fq2のクラス
+    """
+    if fq in _fq2_cache:
+        return _fq2_cache[fq]
+    
+    class _Fq2(metaclass=FactoryType):
         """
         Fqの拡大体Fq2 = Fq[x]/(x^2 + x + 1)を表すクラス。
         
+        元(a,b) = a*x + b*x^2の係数a,bは、mod qで還元された整数として__slots__に保持する。
+        (x(),y()は必要な時にFqの元を生成して返す)
+        元は不変(immutable)でhash可能。演算は新しい元を返す。
+        演算子は引数を検査するが、内部では検査を省略した_makeを使用する。
+        
         [注意]
         q%3 == 2を満たさないと正しく動かないことに注意。
         """
+        __slots__ = ("_a","_b")
 
         def __init__(self,x,y):
             assert isinstance(x,(self._fq,int))
             assert isinstance(y,(self._fq,int))
             
-            if isinstance(x,self._fq): self._x = x
-            else: self._x = self._fq(x % self._q)
+            if isinstance(x,self._fq): _set_a(self,x.val())
+            else: _set_a(self,x % self._q)
+
+            if isinstance(y,self._fq): _set_b(self,y.val())
+            else: _set_b(self,y % self._q)
+
+        @classmethod
+        def _make(cls,a,b):
+            """
+            mod qで還元された整数a,bから、検査をせずに元を生成する。(内部用)
+            GTから呼んだ場合はGTの元を返す。
+            """
+            z = _new(cls)
+            _set_a(z,a)
+            _set_b(z,b)
+            return z
 
-            if isinstance(y,self._fq): self._y = y
-            else: self._y = self._fq(y % self._q)
+        def __setattr__(self,name,value):
+            raise AttributeError("fq2 is immutable")
 
         def __str__(self):
-            return "(%s,%s)"%(str(self._x),str(self._y))
+            return "(%d,%d)"%(self._a,self._b)
     
         def __repr__(self):
             return str(self)
         
         def __add__(self,other):
             assert isinstance(other,_Fq2)
-            return _Fq2(self._x + other._x,self._y + other._y)
+            q = self._q
+            return _make((self._a + other._a) % q,(self._b + other._b) % q)
             
         def __radd__(self,other):
             return self + other
 
-        def __iadd__(self,other):
-            assert isinstance(other,_Fq2)
-            self._x = (self._x + other._x)
-            self._y = (self._y + other._y)
-            
-            return self
-        
         def __sub__(self,other):
             assert isinstance(other,_Fq2)
-            return _Fq2(self._x - other._x,self._y - other._y)
-        
-        def __isub__(self,other):
-            assert isinstance(other,_Fq2)
-            self._x = (self._x - other._x)
-            self._y = (self._y - other._y)
-            
-            return self
+            q = self._q
+            return _make((self._a - other._a) % q,(self._b - other._b) % q)
         
         def __mul__(self,other):
             assert isinstance(other,(_Fq2,self._fq,int))
-            if isinstance(other,int):
-                return self*_int_to_fq2(self.__class__,other)
-            elif isinstance(other,self._fq):
-                return self*_fq_to_fq2(self.__class__,other)
-            else:
-                return _mul_fq2(self.__class__,self,other)
+            if isinstance(other,_Fq2):
+                return _mul_fq2(_Fq2,self,other)
+            q = self._q
+            n = other if isinstance(other,int) else other.val()
+            return _make(self._a*n % q,self._b*n % q)
             
         def __rmul__(self,other):
             return self*other
         
-        def __imul__(self,other):
-            assert isinstance(other,(_Fq2,self._fq,int))
-            if isinstance(other,int):
-                self._x,self._y = _mul_tuple(self,_int_to_fq2(other))
-            elif isinstance(other,self._fq):
-                self._x,self._y = _mul_tuple(self,_fq_to_fq2(other))
-            else:
-                self._x,self._y = _mul_tuple(self,other)
-                
-            return self
-        
         def __truediv__(self,other):
             assert isinstance(other,(_Fq2,self._fq,int))
-            assert other._x != 0 or other._y != 0
             
             if isinstance(other,int):
-                return self*_inv_fq2(self.__class__,_int_to_fq2(other))
+                return self*inv(other % self._q,self._q)
             elif isinstance(other,self._fq):
-                return self*_inv_fq2(self.__class__,_fq_to_fq2(other))
+                return self*inv(other.val(),self._q)
             else:
-                return self*_inv_fq2(self.__class__,other)
+                return self*_inv_fq2(_Fq2,other)
             
         def __rtruediv__(self,other):
             assert isinstance(other,int)            
-            return _int_to_fq2(self.__class__,other)/self
-        
-        def __idiv__(self,other):
-            assert isinstance(other,(_Fq,self._fq,int))
-            if isinstance(other,int):
-                d = _inv_fq2(self.__clas__,_int_to_fq2(other))
-            elif isinstance(other,self._fq):
-                d = _inv_fq2(self.__clas__,_fq_to_fq2(other))
-            else:
-                d = _inv_fq2(self.__clas__,other)
-
-            self._x,self._y = _mul_tuple(self,d)
-            return self
+            return _int_to_fq2(_Fq2,other)/self
         
         def __pow__(self,e):
             r = sq_and_mul_fq(self,e)
             return r
 
         def __neg__(self):
-            return _Fq2(-self._x,-self._y)
+            q = self._q
+            return _make(-self._a % q,-self._b % q)
+
+        def square(self):
+            """
+            2乗を計算。(_square_ints)
+            """
+            q = self._q
+            a,b = _square_ints(self._a,self._b)
+            return _make(a % q,b % q)
+
+        def conj(self):
+            """
+            共役(Frobenius写像) (a,b)^q = (b,a)を返す。
+            """
+            return _make(self._b,self._a)
         
         def __eq__(self,other):
-            assert isinstance(other,_Fq2) or isinstance(other,self._fq) or isinstance(other,int)
-            if isinstance(other,int):
+            if isinstance(other,_Fq2):
+                return self._a == other._a and self._b == other._b
+            elif isinstance(other,int):
                 n = (-other)%self._q # -other(マイナス)であることに注意。
-                return self._x == n and self._y == n
+                return self._a == n and self._b == n
             elif isinstance(other,self._fq):
-                n = (-fq.val())%self._q
-                return self._x == n and self._y == n
-            else:
-                return self._x == other._x and self._y == other._y
+                n = (-other.val())%self._q
+                return self._a == n and self._b == n
+            return NotImplemented
             
         def __ne__(self,other):
             return not self == other
 
+        def __reduce__(self):
+            return self.__class__,(self._a,self._b)
+
+        def __hash__(self):
+            # Fqの元n = (-n,-n)は整数n(及びFqの元)と等しいので、hash値も揃える。
+            if self._a == self._b:
+                return hash(-self._a % self._q)
+            return hash((self._a,self._b))
+
+        def to_bytes(self):
+            """
+            各座標をqのバイト長のビッグエンディアンで表して連結したバイト列(標準的な表現)を返す。
+            @return:bytes
+            """
+            k = (self._q.bit_length() + 7)//8
+            return self._a.to_bytes(k,"big") + self._b.to_bytes(k,"big")
+
         def x(self):
-            return self._x
+            return self._fq._make(self._a)
 
         def y(self):
-            return self._y
+            return self._fq._make(self._b)
 
         def trace(self):
             """
@@ -220,8 +263,7 @@ def Fq2(fq):
             (a+b,a+b) = (a+b)*x + (a+b)*x^2 = (a+b)(x + x^2) = -(a+b)
             最後の等式においてx^2 + x + 1 = 0を使用した。
             """
-            z = self._x + self._y
-            return self._fq(-z)
+            return self._fq._make(-(self._a + self._b) % self._q)
         
         @staticmethod
         def name():
@@ -240,11 +282,417 @@ def Fq2(fq):
         def modulo():
             return fq2._q
 
+    class _GT(_Fq2):
+        """
+        ノルムが1であるFq2の元(unitaryな元)を表すクラス。
+        i.e. x^(q+1) = 1を満たすFq2の元で、位数がq+1を割る数mであるPairingの値はこの群に属する。
+        
+        x = (a,b)のノルムは x*x^q = a^2 - ab + b^2 = 1なので、
+        (1) 逆元は共役(Frobenius写像) x^(-1) = x^q = (b,a)。
+        (2) 2乗は ab = a^2 + b^2 - 1を使って、2回の2乗だけで計算できる。
+        (3) 冪は逆元が無料なので、符号付き2進数(NAF)を使う。
+        (4) 大きな指数の冪は、トレースのLucas数列を使ってFq上の演算のみで計算する。
+        """
+        __slots__ = ()
+
+        def __mul__(self,other):
+            if isinstance(other,_GT):
+                q = self._q
+                a,b = _mul_ints(self._a,self._b,other._a,other._b)
+                return _make_gt(a % q,b % q)
+            else: # unitaryであるとは限らない。
+                return _make(self._a,self._b)*other
+
+        def __truediv__(self,other):
+            if isinstance(other,_GT):
+                return self*other.conj()
+            else:
+                return _make(self._a,self._b)/other
+
+        def __rtruediv__(self,other):
+            assert isinstance(other,int)
+            if other == 1:
+                return self.conj()
+            else:
+                return self.conj()*other
+            
+        def __pow__(self,e):
+            """
+            x^eを計算。
+            指数が小さい場合はpow_naf、それ以外はpow_lucasを使用する。
+            (pow_lucasは指数によらず一回の逆元の計算が必要なため)
+            """
+            assert isinstance(e,int)
+            
+            if abs(e).bit_length() <= 8:
+                return self.pow_naf(e)
+            else:
+                return self.pow_lucas(e)
+            
+        def pow_naf(self,e):
+            """
+            x^eを、符号付き2進数(NAF)と2乗の公式を使って計算。
+            
+            @param e:int
+            @return:GT
+            """
+            assert isinstance(e,int)
+            
+            if e < 0:
+                return self.conj().pow_naf(-e)
+            elif e == 0:
+                return _GT.one()
+            
+            inv = self.conj()
+            digits = wnaf(e,2)
+            r = self
+            for i in range(len(digits)-2,-1,-1):
+                r = r.square()
+                if(digits[i] == 1):
+                    r = r*self
+                elif(digits[i] == -1):
+                    r = r*inv
+            return r
+
+        def pow_trace(self,e):
+            """
+            Tr(x^e)を、Lucas数列(misc.lucas_sequence)を使ってFq上の演算のみで計算。
+            
+            @param e:int
+            @return:Fq
+            """
+            assert isinstance(e,int)
+            
+            t = self.trace().val()
+            v,_ = lucas_sequence(t,abs(e),self._q) # Tr(x^(-e)) = Tr(x^e)
+            return self._fq(v)
+        
+        def pow_lucas(self,e):
+            """
+            x^eを、Lucas数列(misc.lucas_sequence)を使ってFq上の演算のみで計算。
+            t = Tr(x)、V_k = Tr(x^k)、U_k = (x^k - x^(-k))/(x - x^(-1))とすると、
+            x^e = U_e*(x - t/2) + V_e/2、U_e = (2*V_{e+1} - t*V_e)/(t^2 - 4)
+            が成り立つ。Fq2の乗算は一切行わない。
+            
+            @param e:int
+            @return:GT
+            """
+            assert isinstance(e,int)
+            
+            if e < 0:
+                return self.conj().pow_lucas(-e)
+
+            q = self._q
+            t = self.trace().val()
+            d = (t*t - 4) % q
+            if d == 0: # x = 1 或いは x = -1
+                return self.pow_naf(e)
+            
+            v0,v1 = lucas_sequence(t,e,q)
+            u = (2*v1 - t*v0)*inv(d,q) % q
+            half = (q + 1)//2 # 1/2
+            c = t*half % q
+            h = v0*half % q
+            # Fqの元cは(-c,-c)と表されることに注意。
+            x = u*(self._a + c) - h
+            y = u*(self._b + c) - h
+            return _make_gt(x % q,y % q)
+        
+        def conj(self):
+            """
+            共役(Frobenius写像) x^q = (b,a)を返す、unitaryな元では逆元と一致する。
+            """
+            return _make_gt(self._b,self._a)
+        
+        def square(self):
+            """
+            x^2 = (b^2 - 2ab,a^2 - 2ab) = (2 - 2a^2 - b^2,2 - a^2 - 2b^2)を返す。
+            """
+            q = self._q
+            aa = self._a**2
+            bb = self._b**2
+            return _make_gt(-(2*aa + bb - 2) % q,-(aa + 2*bb - 2) % q)
+
+        def is_unitary(self):
+            """
+            ノルムが1であるか否かを判定する。
+            """
+            a = self._a
+            b = self._b
+            return (a*a - a*b + b*b) % self._q == 1
+            
+        @staticmethod
+        def one():
+            q = fq2._q
+            return _make_gt(q - 1,q - 1)
+
+        def compress(self):
+            """
+            トーラスT2による圧縮形式(T2)を返す。
+            """
+            return _T2.compress(self)
+
+    class _T2(metaclass=FactoryType):
+        """
+        GTの元をトーラスT2により一つのFqの値mで表すクラス。(圧縮形式)
+
+        ノルムが1である x = (a,b) != 1に対し、m = a/(b + 1)とする。
+        ノルムが1でb = -1を満たすのは x = (0,-1)(m = 2とする)と x = 1のみ。
+        逆に N = m^2 - m + 1 (q%3 == 2より0にならない)とすると、
+        x = ((2m - m^2)/N,(1 - m^2)/N)。
+        単位元1はmの値域外のqで表すので、mは0 <= m <= qの整数となる。
+
+        圧縮形式のままで
+        (1) 積 m1*m2 => (m1*m2 - 1)/(m1 + m2 - 1)
+        (2) 2乗 m^2 => (m^2 - 1)/(2m - 1)
+        (3) 逆元 m^(-1) => 1 - m
+        が計算できる。(1)(2)はFqの逆元を一回必要とするが、(3)と比較は無料。
+        """
+        __slots__ = ("_m",)
+
+        def __init__(self,m):
+            assert isinstance(m,int)
+            assert 0 <= m <= self._q
+            _set_m(self,m)
+
+        def __setattr__(self,name,value):
+            raise AttributeError("t2 is immutable")
+
+        def __str__(self):
+            return str(self._m)
+
+        def __repr__(self):
+            return str(self)
+
+        def __eq__(self,other):
+            # GTの元とは比較しない。(compress或いはdecompressで揃えること)
+            if isinstance(other,_T2):
+                return self._m == other._m
+            return NotImplemented
+
+        def __ne__(self,other):
+            return not self == other
+
+        def __hash__(self):
+            return hash(self._m)
+
+        def __mul__(self,other):
+            assert isinstance(other,_T2)
+            q = self._q
+            m1,m2 = self._m,other._m
+            if m1 == q: return other
+            if m2 == q: return self
+
+            d = (m1 + m2 - 1) % q
+            if d == 0: # 積が1
+                return _T2(q)
+            return _T2((m1*m2 - 1)*inv(d,q) % q)
+
+        def __truediv__(self,other):
+            assert isinstance(other,_T2)
+            return self*other.conj()
+
+        def __pow__(self,e):
+            assert isinstance(e,int)
+            return _T2.compress(self.decompress()**e)
+
+        def conj(self):
+            """
+            共役(= 逆元) 1 - mを返す。
+            """
+            q = self._q
+            if self._m == q:
+                return self
+            return _T2((1 - self._m) % q)
+
+        def square(self):
+            """
+            (m^2 - 1)/(2m - 1)を返す。
+            """
+            q = self._q
+            m = self._m
+            if m == q: return self
+
+            d = (2*m - 1) % q
+            if d == 0: # 位数2の元 -1
+                return _T2(q)
+            return _T2((m*m - 1)*inv(d,q) % q)
+
+        def __reduce__(self):
+            return _T2,(self._m,)
+
+        def is_one(self):
+            return self._m == self._q
+
+        def val(self):
+            return self._m
+
+        def decompress(self):
+            """
+            GTの元に戻す。
+            @return:GT
+            """
+            q = self._q
+            m = self._m
+            if m == q:
+                return _GT.one()
+
+            n = inv((m*m - m + 1) % q,q)
+            return _make_gt((2*m - m*m)*n % q,(1 - m*m)*n % q)
+
+        def to_bytes(self):
+            """
+            ビッグエンディアンの固定長(qのバイト長)のバイト列に変換。
+            @return:bytes
+            """
+            return self._m.to_bytes(_T2.nbytes(),"big")
+
+        @staticmethod
+        def from_bytes(data):
+            """
+            to_bytesで変換したバイト列から元に戻す。
+            @param data:bytes
+            @return:T2
+            """
+            assert len(data) == _T2.nbytes()
+            return _T2(int.from_bytes(data,"big"))
+
+        @staticmethod
+        def nbytes():
+            return (_T2._q.bit_length() + 7)//8
+
+        @staticmethod
+        def compress(x):
+            """
+            GTの元xを圧縮する。
+            @param x:GT
+            @return:T2
+            """
+            assert isinstance(x,_GT)
+            q = x._q
+            a = x._a
+            b = x._b
+            if b == q - 1: # x = 1 或いは x = (0,-1)
+                return _T2(q if a == q - 1 else 2)
+            return _T2(a*inv(b + 1,q) % q)
+
     assert fq.modulo()%3 == 2
     
+    _set_a = _Fq2._a.__set__ # __setattr__を経由せずに_a,_bを設定する。
+    _set_b = _Fq2._b.__set__
+    _new = object.__new__
+    _make = _Fq2._make
+    _make_gt = _GT._make
+    _set_m = _T2._m.__set__
     fq2 = _Fq2
     fq2._fq = fq
     fq2._q = fq.modulo()
     fq2._name = "fq2"
+    fq2._gt = _GT
+    fq2._t2 = _T2
+    _T2._q = fq2._q
+    fq2._factory,fq2._factory_args = Fq2,(fq,)
+    _GT._factory,_GT._factory_args = GT,(fq2,)
+    _T2._factory,_T2._factory_args = T2,(fq2,)
+    _fq2_cache[fq] = fq2
     return fq2
 
+def GT(fq2):
+    """
+    Fq2のunitaryな元のクラスを返す。(Pairingの値域)
+    
+    @param fq2:Fq2のクラス
+    @return: GTのクラス
+    """
+    assert fq2.name() == "fq2"
+    return fq2._gt
+
+def T2(fq2):
+    """
+    GTの元の圧縮形式(トーラスT2)のクラスを返す。
+    
+    @param fq2:Fq2のクラス
+    @return: T2のクラス
+    """
+    assert fq2.name() == "fq2"
+    return fq2._t2
+
+def sizeof(obj):
+    """
+    objが使用しているメモリのバイト数を(インスタンス変数も含めて)概算する。
+    """
+    size = sys.getsizeof(obj)
+    d = getattr(obj,"__dict__",None)
+    if d is not None:
+        size += sys.getsizeof(d) + sum(sizeof(v) for v in d.values())
+    for cls in type(obj).__mro__:
+        for name in getattr(cls,"__slots__",()):
+            if hasattr(obj,name):
+                size += sizeof(getattr(obj,name))
+    return size
+
+class FixedBasePow:
+    """
+    Fq2の固定された元gの冪g^eを、事前計算テーブルを使って計算するクラス。
+    (ec.FixedBaseのFq2版、e.g. g = Pairingの値)
+    
+    eをwindowビットごとの桁 e = sum(d_i * 2^(window*i)) に分解し、
+    table[i][d] = g^(d*2^(window*i)) (1 <= d < 2^window)
+    を保存しておく。
+    g^eは2乗を一切行わずに、高々ceil(bits/window)回の乗算で求まる。
+    """
+    def __init__(self,g,bits,window=4):
+        """
+        @param g:Fq2
+        @param bits:int 指数の最大ビット長
+        @param window:int 窓の幅
+        """
+        assert g.name() == "fq2"
+        assert isinstance(bits,int) and bits > 0
+        assert isinstance(window,int) and window > 0
+
+        self.g = g
+        self.window = window
+        self.rows = -(-bits//window)
+        self.bits = self.rows*window
+        
+        self.table = []
+        base = g # base = g^(2^(window*i))
+        for i in range(self.rows):
+            row = [None,base]
+            for d in range(2,1 << window):
+                row.append(row[-1]*base)
+            self.table.append(row)
+            base = row[-1]*base
+
+    def nbytes(self):
+        """
+        テーブルが使用しているメモリのバイト数(概算)を返す。
+        @return:int
+        """
+        return sum(sizeof(z) for row in self.table for z in row[1:])
+        
+    def pow(self,e):
+        """
+        g^e を計算。
+        @param e:int
+        @return:Fq2
+        """
+        assert isinstance(e,int)
+
+        if e < 0:
+            return 1/self.pow(-e)
+        elif e >> self.bits: # テーブルの範囲外。
+            return self.g**e
+        
+        mask = (1 << self.window) - 1
+        r = None
+        for row in self.table:
+            d = e & mask
+            if d:
+                r = row[d] if r is None else r*row[d]
+            e >>= self.window
+
+        if r is None: # e == 0、gと同じクラス(e.g. GT)の1を返す。
+            return type(self.g)(-1,-1)
+        return r
@@ -1,15 +1,30 @@
 import hashlib
+from collections import OrderedDict
 
 from .ec import EC
 from .fq import Fq
-from .fq2 import Fq2
-from .pairing import weil_pairing
+from .fq2 import FixedBasePow,sizeof
+from .pairing import weil_pairing,tate_pairing,multi_pairing,PreparedPoint
 from .misc import rand_between,sq_and_mul
 from .prime import is_prime,rand_prime
 
+def _int_to_ff(ec,n):
+    """
+    整数nを楕円曲線ecの係数体の元に変換。
+    
+    @param ec:EC
+    @param n:int
+    @return: fq or fq2
+    """
+    if ec.ff.name() == "fq2":
+        return ec.ff.int_to_fq2(n)
+    else:
+        return ec.ff(n)
+
 def find_random_point(ec):
     """
     楕円曲線上のランダムな点を求める。
+    ecはFq上、Fq2上のどちらの楕円曲線でもよいが、点の座標は常にFqの元。
     
     @param ec:EC
     @return: 楕円曲線上のランダムな点。
@@ -17,7 +32,7 @@ def find_random_point(ec):
     
     # 楕円曲線は y^2 = x^3 + 1と仮定。
     assert isinstance(ec,EC)
-    assert ec.ff.name() == "fq2"
+    assert ec.ff.name() in ("fq","fq2")
     assert ec.a == 0
     assert ec.b == 1
     
@@ -27,8 +42,8 @@ def find_random_point(ec):
     y = rand_between(0,q - 1)
     x = sq_and_mul(y*y - 1,(2*q - 1)//3,q)
     
-    x = ec.ff.int_to_fq2(x)
-    y = ec.ff.int_to_fq2(y)
+    x = _int_to_ff(ec,x)
+    y = _int_to_ff(ec,y)
     p = ec.point(x,y)
 
     return p
@@ -43,7 +58,6 @@ def find_order_l(ec,l):
     @return: 位数lをもつ楕円曲線上の点。
     """
     assert isinstance(ec,EC)
-    assert ec.ff.name() == "fq2"
     assert isinstance(l,int)
     
     p = None
@@ -90,25 +104,103 @@ def phi(ec,p):
     result = ec.point(p.x*phi.omega,p.y)
     return result
 
-def modified_weil_pairing(ec,p1,p2,l):
+def modified_weil_pairing(ec,p1,p2,l,pool=None):
     """
     位数lに関する、インプットをp1,p2とするModified Weil Pairingを計算。
     i.e. e_{l}(p1,p2)を計算、この値はFq2上でlのべき乗根である。
+    ecがFq上の楕円曲線の場合、p1,p2はここで初めてFq2上へ持ち上げられる。
     
     @param ec:EC
     @param p1: 楕円曲線ec上の点
     @param p2: 楕円曲線ec上の点
     @param l: Weil Pairingに使う自然数
+    @param pool:PairingPool 指定した場合、4つのMiller's algorithmを並列に計算する。
+                            (e.g. dec(...,pairing=functools.partial(modified_weil_pairing,pool=pool)))
     @return: 位数lをもつFq2の値
     """
     assert isinstance(ec,EC)
-    assert ec.ff.name() == "fq2"
     assert isinstance(p1,ec.point)
     assert isinstance(p2,ec.point)
     assert isinstance(l,int)
     
-    s = find_random_point(ec)# 確率的に"悪い"ランダムな点を選ぶ可能性あり。
-    return weil_pairing(ec,p1,phi(ec,p2),s,l)
+    ext = ec.extension()
+    p1 = ec.lift(p1)
+    p2 = ec.lift(p2)
+    
+    s = find_random_point(ext)# 確率的に"悪い"ランダムな点を選ぶ可能性あり。
+    return weil_pairing(ext,p1,phi(ext,p2),s,l,pool)
+    
+def modified_tate_pairing(ec,p1,p2,l,naf=False):
+    """
+    位数lに関する、インプットをp1,p2とするModified Tate Pairingを計算。
+    i.e. t_{l}(p1,phi(p2))を計算、この値はFq2上でlのべき乗根である。
+    modified_weil_pairingとは値が異なるが、同様に双線形かつ非退化であり、
+    Miller's algorithmを一度しか使わないため高速。
+    
+    @param ec:EC
+    @param p1: 楕円曲線ec上の点、或いはprepare_pairingの戻り値
+    @param p2: 楕円曲線ec上の点
+    @param l: Tate Pairingに使う自然数
+    @param naf:bool Trueの場合、Miller's algorithmでlを符号付き2進数(NAF)で表現する。(値は変わらない)
+    @return: 位数lをもつFq2の値
+    """
+    assert isinstance(ec,EC)
+    assert isinstance(p1,(ec.point,PreparedPoint))
+    assert isinstance(p2,ec.point)
+    assert isinstance(l,int)
+    
+    ext = ec.extension()
+    if not isinstance(p1,PreparedPoint):
+        p1 = ec.lift(p1)
+    p2 = ec.lift(p2)
+    
+    return tate_pairing(ext,p1,phi(ext,p2),l,naf)
+    
+def modified_multi_pairing(ec,pairs,l,pool=None):
+    """
+    Modified Tate Pairingの積 prod(modified_tate_pairing(ec,p_i,q_i,l)) を計算。
+    Miller's algorithmのfの2乗と最終冪を全てのペアで共有する。
+    (Batch verification等に使用する)
+    
+    @param ec:EC
+    @param pairs:[(p_1,q_1),...] p_iは楕円曲線ec上の点或いはprepare_pairingの戻り値、
+                 q_iは楕円曲線ec上の点
+    @param l:int
+    @param pool:PairingPool 指定した場合、ペアを分割して並列に計算する。
+    @return: 位数lをもつFq2の値
+    """
+    assert isinstance(ec,EC)
+    assert isinstance(l,int)
+
+    ext = ec.extension()
+    lifted = []
+    for p1,p2 in pairs:
+        assert isinstance(p1,(ec.point,PreparedPoint))
+        assert isinstance(p2,ec.point)
+        if not isinstance(p1,PreparedPoint):
+            p1 = ec.lift(p1)
+        lifted.append((p1,phi(ext,ec.lift(p2))))
+        
+    return multi_pairing(ext,lifted,l,pool=pool)
+    
+def prepare_pairing(ec,p,l):
+    """
+    pをPairingの第一引数として何度も使う場合に、
+    Miller's algorithmの直線の係数を事前計算しておく。
+    戻り値はmodified_tate_pairingの第一引数、
+    或いはenc(pub),dec(priv)に点の代わりに渡すことができる。
+    (modified_weil_pairingでは使用できない)
+    
+    @param ec:EC
+    @param p: 楕円曲線ec上の点
+    @param l:int
+    @return: PreparedPoint
+    """
+    assert isinstance(ec,EC)
+    assert isinstance(p,ec.point)
+    assert isinstance(l,int)
+    
+    return PreparedPoint(ec.extension(),ec.lift(p),l,naf=True)
     
 def H1(ec,l,string):
     """
@@ -121,7 +213,6 @@ def H1(ec,l,string):
     """
     assert isinstance(ec,EC)
     assert isinstance(l,int)
-    assert ec.ff.name() == "fq2"
     assert isinstance(string,(str,bytes))
     
     if isinstance(string,str):
@@ -133,8 +224,8 @@ def H1(ec,l,string):
     y = int(hashlib.sha1(s).hexdigest(),16) % q    
     x = sq_and_mul(y*y - 1,(2*q - 1)//3,q)
     
-    x = ec.ff.int_to_fq2(x)
-    y = ec.ff.int_to_fq2(y)
+    x = _int_to_ff(ec,x)
+    y = _int_to_ff(ec,y)
     p = ec.point(x,y)
     assert ec.on_curve(p)
 
@@ -149,46 +240,95 @@ def H1(ec,l,string):
 def H2(p,n):
     """
     位数lをもつFq2の点pを長さがnである2進数の文字列に変換。
-    H2(Fq2(x,y)) := Tr(Fq2(x,y)) + q*y、
+    H2(p) := SHAKE256(pの標準的なバイト列表現)の先頭nビット、
     として定義する。
-    ここでTrはFq2上のTrace Map。
     
-    この定義を使用する理由は、H2は単射であるため、つまりCollision Free。
-    Tr(Fq2(x,y))がFqの元つまり、{0,1,...,q-1}の内どれかであることに
-    注意すれば、単射であることの証明は自明。
+    SHAKE256は任意の長さの出力を持つハッシュ関数(XOF)なので、
+    nに上限はなく、どのビットもpの全体に依存する。
 
     @param p:Fq2
     @param n:int
     @return:str
     """
+    return "{:0{}b}".format(_h2_int(p,n),n)
+
+def _h2_bytes(p,nbytes):
+    """
+    H2をバイト列として返す。i.e. SHAKE256(p.to_bytes())の先頭nbytesバイト
+    
+    @param p:Fq2
+    @param nbytes:int
+    @return:bytes
+    """
     assert p.name() == "fq2"
+    assert isinstance(nbytes,int)
+    assert nbytes >= 0
+    
+    return hashlib.shake_256(p.to_bytes()).digest(nbytes)
+
+def _h2_int(p,n):
+    """
+    H2(p,n)を整数として返す。i.e. int(H2(p,n),2)
+    
+    @param p:Fq2
+    @param n:int
+    @return:int
+    """
     assert isinstance(n,int)
     assert n > 0
     
-    x = p.trace().val() + p.modulo()*p.y().val() # この値は整数であることに注意。(Fqの元ではない)
-    format_str = "{:0" + str(n) + "b}"
-    s = format_str.format(x)
-    
-    return s[0:n]
+    nbytes = (n + 7)//8
+    x = int.from_bytes(_h2_bytes(p,nbytes),"big")
+    return x >> (8*nbytes - n)
 
 def xor(s1,s2):
     """
     2進数を表す文字列s1とs2のxorを計算。戻り値も2進数文字列。
     e.g. xor("101","111") => "010"
+    s1,s2がバイト列(bytes,bytearray或いはmemoryview)の場合はbytesを返す。
+    どちらも整数に変換して一度だけxorを計算する。
+
+    @param s1: 2進数を表す文字列 或いはバイト列
+    @param s2: 2進数を表す文字列 或いはバイト列
+    @return: 2進数を表す文字列 或いはbytes
+    """
+    if isinstance(s1,str):
+        assert isinstance(s2,str)
+        assert len(s1) == len(s2)
+        if len(s1) == 0: return ""
+        return "{:0{}b}".format(int(s1,2)^int(s2,2),len(s1))
+    else:
+        b1 = memoryview(s1).cast("B")
+        b2 = memoryview(s2).cast("B")
+        assert len(b1) == len(b2)
+        x = int.from_bytes(b1,"big")^int.from_bytes(b2,"big")
+        return x.to_bytes(len(b1),"big")
 
-    @param s1: 2進数を表す文字列
-    @param s2: 2進数を表す文字列
-    @return: 2進数を表す文字列
+def _mask(m,w,n):
+    """
+    メッセージmと、Pairingの値wから作ったマスクH2(w,n)のxorを計算する。(暗号化と復号化は同じ)
+    mが2進数の文字列の場合は文字列を、バイト列の場合はbytesを返す。
+    
+    @param m:str 或いはバイト列(bytes,bytearray,memoryview)
+    @param w:Fq2
+    @param n:int マスクのビット数(Noneの場合はmのビット数)
+    @return: str 或いはbytes
     """
-    assert len(s1) == len(s2)
-    s = ""
-    for b1,b2 in zip(s1,s2):
-        s += str(int(b1)^int(b2))
-    return s
+    if isinstance(m,str):
+        if n is None: n = len(m)
+        return xor(m,H2(w,n))
+    
+    assert isinstance(m,(bytes,bytearray,memoryview))
+    m = memoryview(m).cast("B")
+    assert n is None or n == 8*len(m)
+    return xor(m,_h2_bytes(w,len(m)))
 
 def prepare(low,high):
     """
     公開鍵を生成。
+    楕円曲線はFq上で定義され、スカラー倍などの演算は全てFq上で行われる。
+    Fq2への持ち上げはPairingの計算時にのみ行われる。
+    
     @param low:ランダムな素数の下限
     @param high:ランダムな素数の上限
     @return: ec(楕円曲線クラス),p(位数lをもつ楕円曲線上の点),l(int)
@@ -199,10 +339,7 @@ def prepare(low,high):
     q,l = prepare_params(low,high)
     
     fq = Fq(q)
-    fq2 = Fq2(fq)
-    a = fq2.int_to_fq2(0)
-    b = fq2.int_to_fq2(1)
-    ec = EC(a,b,fq2) # Fq2上の楕円曲線: y^2 = x^3 + 1を定義。        
+    ec = EC(fq(0),fq(1),fq) # Fq上の楕円曲線: y^2 = x^3 + 1を定義。        
     p = find_order_l(ec,l)    
 
     return ec,p,l
@@ -222,7 +359,7 @@ def pub_keys(ec,p,l):
     assert isinstance(l,int)
     
     s = rand_between(1,l-1)
-    pub = ec.mul(s,p)
+    pub = ec.fixed_base(p,l.bit_length()).mul(s)
     return s,pub
 
 def priv_keys(ec,s,l,id_name):
@@ -244,54 +381,251 @@ def priv_keys(ec,s,l,id_name):
     priv = ec.mul(s,h1)
     return h1,priv
 
-def enc(ec,m,pub,h1,p,l,n):
+def enc(ec,m,pub,h1,p,l,n=None,pairing=modified_weil_pairing):
     """
-    文字列mを暗号化する。
+    メッセージmを暗号化する。
     c1,c2が暗号文。
+    mはバイト列(bytes,bytearray或いはmemoryview)或いは2進数を表す文字列で、
+    c2はバイト列の場合はbytes、文字列の場合は文字列。
+    pairingには復号化(dec)と同じものを指定する必要がある。
+    pubにはprepare_pairing(ec,pub,l)の戻り値を渡してもよい。
     
     @param ec:EC
-    @param m:str
+    @param m:bytes或いはstr
     @param pub:Point
     @param h1:Point
     @param p:Point
     @param l:int
-    @param n:int 2進数を表す文字列の長さを指定する引数。
-    @return: c1(Point),c2(str)
+    @param n:int mのビット数(省略可)
+    @param pairing: modified_weil_pairing或いはmodified_tate_pairing
+    @return: c1(Point),c2(bytes或いはstr)
     """
     assert isinstance(ec,EC)
-    assert isinstance(m,str)
-    assert isinstance(pub,ec.point)
+    assert isinstance(m,(str,bytes,bytearray,memoryview))
+    assert isinstance(pub,(ec.point,PreparedPoint))
     assert isinstance(h1,ec.point)
     assert isinstance(p,ec.point)
     assert isinstance(l,int)
-    assert isinstance(n,int)
+    assert n is None or isinstance(n,int)
     
+    if isinstance(pub,PreparedPoint):
+        # Pairingは対称なので e(h1,pub) = e(pub,h1)。
+        g_id = pairing(ec,pub,h1,l)
+    else:
+        g_id = pairing(ec,h1,pub,l)
+
+    return _enc_with(ec,m,lambda r: g_id**r,p,l,n)
+
+def _enc_with(ec,m,g_id_pow,p,l,n):
+    """
+    g_id = pairing(h1,pub)の冪を計算する関数g_id_pow(r) = g_id^rを使って、
+    メッセージmを暗号化する。
+    """
     r = rand_between(1,l-1)
-    g_id = modified_weil_pairing(ec,h1,pub,l)
-    
-    c1 = ec.mul(r,p)
-    c2 = xor(m,H2(g_id**r,n))
+    c1 = ec.fixed_base(p,l.bit_length()).mul(r)
+    c2 = _mask(m,g_id_pow(r),n)
     return c1,c2
 
-def dec(ec,c1,c2,priv,l,n):
+def dec(ec,c1,c2,priv,l,n=None,pairing=modified_weil_pairing):
     """
     暗号文(c1,c2)を復号化する。
+    c2がバイト列の場合はbytes、文字列の場合は文字列を返す。
+    privにはprepare_pairing(ec,priv,l)の戻り値を渡してもよい。
     
     @param ec:EC
     @param c1:Point
-    @param c2:str
+    @param c2:bytes或いはstr
     @param priv:Point
     @param l:int
-    @param n:int 2進数を表す文字列の長さを指定する引数。
-    @return: m(str)
+    @param n:int c2のビット数(省略可)
+    @param pairing: modified_weil_pairing或いはmodified_tate_pairing
+    @return: m(bytes或いはstr)
     """
     assert isinstance(ec,EC)
     assert isinstance(c1,ec.point)
-    assert isinstance(c2,str)
-    assert isinstance(priv,ec.point)
+    assert isinstance(c2,(str,bytes,bytearray,memoryview))
+    assert isinstance(priv,(ec.point,PreparedPoint))
     assert isinstance(l,int)    
-    assert isinstance(n,int)
+    assert n is None or isinstance(n,int)
     
-    w = modified_weil_pairing(ec,priv,c1,l)
-    m = xor(c2,H2(w,n))
+    w = pairing(ec,priv,c1,l)
+    m = _mask(c2,w,n)
     return m
+
+class _LRUCache:
+    """
+    最大でmaxsize個(かつ合計maxbytesバイト)の要素を保持するLRUキャッシュ。
+    キャッシュのヒット数、ミス数、追い出した要素の数を記録する。
+    """
+    def __init__(self,maxsize,maxbytes=None):
+        assert isinstance(maxsize,int)
+        assert maxsize >= 0
+        assert maxbytes is None or isinstance(maxbytes,int)
+        
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict() # key => (value,バイト数)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self,key):
+        """
+        keyに対応する値を返す、存在しない場合はNoneを返す。
+        """
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+            return item[0]
+
+    def put(self,key,value,nbytes=0):
+        """
+        keyに対応する値value(バイト数nbytes)を保存し、
+        maxsize或いはmaxbytesを超えた分は古いものから追い出す。
+        """
+        if self.maxsize == 0: return
+        
+        if key in self._data:
+            self.nbytes -= self._data[key][1]
+        self._data[key] = (value,nbytes)
+        self._data.move_to_end(key)
+        self.nbytes += nbytes
+        
+        while len(self._data) > self.maxsize or \
+              (self.maxbytes is not None and self.nbytes > self.maxbytes and len(self._data) > 1):
+            _,(_,size) = self._data.popitem(last=False)
+            self.nbytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+        self.nbytes = 0
+
+class Encryptor:
+    """
+    同じシステム公開鍵(p,pub)で何度も暗号化するためのクラス。
+    
+    g_id = pairing(H1(id),pub)はIDとシステム公開鍵のみに依存するので、
+    IDごとにLRUキャッシュに保存して再利用する。
+    windowがNone(デフォルト)の場合は、g_idをトーラスT2で圧縮して保存し、
+    g_id^rはLucas数列(GT.pow_lucas)で計算する。
+    windowを指定した場合は、g_idと共にg_id^rを計算するためのテーブル(FixedBasePow)も保存する。
+    同様にH1(id)もオプションでキャッシュする。
+    
+    [注意]
+    160ビットのlでは、圧縮したg_idはIDごとに約88バイトなので、
+    デフォルトのmaxsize = 4096でも約360KBに収まる。
+    テーブルはIDごとに約(lのビット数/window)*2^window個のFq2の元を持ち、
+    (160ビットのl、window=4でIDごとに約86KB)
+    g_id^rの計算はLucas数列と比べて僅かに速いだけなので、
+    ごく少数の頻繁に使うIDに対してmaxsizeを小さくして使用すること。
+    (maxbytes = 64MBの場合、テーブルは約770ID分までしか保存されない)
+    """
+    def __init__(self,ec,p,pub,l,pairing=modified_weil_pairing,maxsize=4096,maxbytes=64 << 20,window=None,h1_maxsize=0):
+        """
+        @param ec:EC
+        @param p:Point
+        @param pub:Point or PreparedPoint
+        @param l:int
+        @param pairing: 復号化(dec)と同じpairing
+        @param maxsize:int キャッシュするg_idの最大数
+        @param maxbytes:int g_idのキャッシュの最大バイト数(Noneの場合は制限なし)
+        @param window:int FixedBasePowの窓の幅(Noneの場合はテーブルを作らない)
+        @param h1_maxsize:int キャッシュするH1(id)の最大数(0の場合はキャッシュしない)
+        """
+        assert isinstance(ec,EC)
+        assert isinstance(p,ec.point)
+        assert isinstance(pub,(ec.point,PreparedPoint))
+        assert isinstance(l,int)
+        
+        self.ec = ec
+        self.p = p
+        self.pub = pub
+        self.l = l
+        self.pairing = pairing
+        self.window = window
+        self.g_cache = _LRUCache(maxsize,maxbytes)
+        self.h1_cache = _LRUCache(h1_maxsize)
+
+    def h1(self,id_name):
+        """
+        H1(id_name)を返す。
+        @param id_name:str
+        @return:Point
+        """
+        h1 = self.h1_cache.get(id_name)
+        if h1 is None:
+            h1 = H1(self.ec,self.l,id_name)
+            self.h1_cache.put(id_name,h1)
+        return h1
+
+    def _lookup(self,id_name):
+        """
+        キャッシュからid_nameに対応する(g_id,FixedBasePow或いはNone)を返す。
+        キャッシュにない場合はPairingを計算してキャッシュに保存する。
+        """
+        item = self.g_cache.get(id_name)
+        if item is None:
+            h1 = self.h1(id_name)
+            if isinstance(self.pub,PreparedPoint):
+                # Pairingは対称なので e(h1,pub) = e(pub,h1)。
+                g_id = self.pairing(self.ec,self.pub,h1,self.l)
+            else:
+                g_id = self.pairing(self.ec,h1,self.pub,self.l)
+                
+            if self.window is None:
+                # g_idはトーラスT2で圧縮して保存する。(Fqの値一つ)
+                z = g_id.compress()
+                self.g_cache.put(id_name,(z,None),sizeof(z))
+                return g_id,None
+            
+            table = FixedBasePow(g_id,self.l.bit_length(),self.window)
+            item = (g_id,table)
+            self.g_cache.put(id_name,item,table.nbytes())
+        elif item[1] is None:
+            return item[0].decompress(),None
+        return item
+    
+    def g_id(self,id_name):
+        """
+        g_id = pairing(H1(id_name),pub)を返す。
+        @param id_name:str
+        @return: 位数lをもつFq2の値
+        """
+        return self._lookup(id_name)[0]
+    
+    def enc(self,id_name,m,n=None):
+        """
+        IDがid_nameである受信者に向けてメッセージmを暗号化する。
+        (enc(ec,m,pub,H1(id_name),p,l,n,pairing)と同じ)
+        
+        @param id_name:str
+        @param m:bytes或いはstr
+        @param n:int mのビット数(省略可)
+        @return: c1(Point),c2(bytes或いはstr)
+        """
+        assert isinstance(id_name,str)
+        assert isinstance(m,(str,bytes,bytearray,memoryview))
+        assert n is None or isinstance(n,int)
+
+        g_id,table = self._lookup(id_name)
+        if table is None:
+            g_id_pow = lambda r: g_id**r
+        else:
+            g_id_pow = table.pow
+        return _enc_with(self.ec,m,g_id_pow,self.p,self.l,n)
+
+    def clear(self):
+        """
+        キャッシュを空にする。
+        """
+        self.g_cache.clear()
+        self.h1_cache.clear()
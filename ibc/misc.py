@@ -1,7 +1,20 @@
-from copy import copy
+import copyreg
 from random import randint
 from .prime import is_prime
 
+class FactoryType(type):
+    """
+    Fq,Fq2,Pointなどのファクトリ関数が生成するクラスのメタクラス。
+    クラスは生成したファクトリ関数_factoryとその引数_factory_argsを保持し、
+    pickleの際はクラスの名前ではなく _factory(*_factory_args) として保存される。
+    (ファクトリ関数は同じ引数に対して同じクラスを返すので、元のクラスに戻る)
+    """
+
+def _reduce_factory_type(cls):
+    return cls._factory,cls._factory_args
+
+copyreg.pickle(FactoryType,_reduce_factory_type)
+
 def rand_between(low,high):
     """
     low <= x <= highを満たす乱数xを返す。
@@ -49,22 +62,98 @@ def sq_and_mul_fq(a,e):
     
     b = "{:b}".format(e)
     t = len(b)
-    r = copy(a)
+    r = a
     
     for i in range(1,t):
-        r *= r
+        r = r.square()
         if(b[i] == '1'):
-            r *= a
+            r = r*a
     return r            
 
-def inv(a,p):
+def wnaf(n,width):
+    """
+    非負整数nの幅widthのwNAF(windowed Non-Adjacent Form)を計算。
+    n = sum(d_i * 2^i)を満たす桁d_iのリストを下位の桁から順に返す。
+    各桁は0或いは|d_i| < 2^(width-1)を満たす奇数で、
+    非零の桁の間には少なくともwidth-1個の0が並ぶ。
+    
+    @param n:int
+    @param width:int >= 2
+    @return:list
+    """
+    assert isinstance(n,int)
+    assert isinstance(width,int)
+    assert n >= 0
+    assert width >= 2
+
+    full = 1 << width
+    half = 1 << (width - 1)
+    digits = []
+    while(n > 0):
+        if(n & 1):
+            d = n & (full - 1)
+            if(d >= half):
+                d -= full
+            n -= d
+        else:
+            d = 0
+        digits.append(d)
+        n >>= 1
+    return digits
+
+def lucas_sequence(t,e,n):
+    """
+    Lucas数列 V_0 = 2,V_1 = t,V_{k+1} = t*V_k - V_{k-1} (mod n)の
+    (V_e,V_{e+1})を計算。
+    ノルムが1である元xのトレースがtの場合、V_k = Tr(x^k)となる。
+    V_{2k} = V_k^2 - 2、V_{2k+1} = V_k*V_{k+1} - tを使用するので、
+    1ビットあたり2回の乗算で済む。
+    
+    @param t:int
+    @param e:int >= 0
+    @param n:int
+    @return: (V_e,V_{e+1})
+    """
+    assert isinstance(t,int)
+    assert isinstance(e,int)
+    assert isinstance(n,int)
+    assert e >= 0
+    
+    v0 = 2 % n
+    v1 = t % n
+    for b in "{:b}".format(e):
+        if(b == '1'):
+            v0,v1 = (v0*v1 - t) % n,(v1*v1 - 2) % n
+        else:
+            v0,v1 = (v0*v0 - 2) % n,(v0*v1 - t) % n
+    return v0,v1
+
+INV_ENGINE = "builtin"
+
+def _inv_euclid(a,p):
+    """
+    拡張ユークリッドの互除法を使って1/a (mod p)を計算。
+    0 < a < pであること。
+    """
+    x0,x1 = 1,0
+    r0,r1 = a,p
+    while r1:
+        k = r0//r1
+        r0,r1 = r1,r0 - k*r1
+        x0,x1 = x1,x0 - k*x1
+    return x0 % p
+
+def inv(a,p,engine=None):
     """
     1/a (mod p)を計算。
-    フェルマーの小定理を使って計算していることに注意、
-    つまり 1/a = a**(p - 2) (mod p).
+    engineで計算方法を選択できる。(省略した場合はINV_ENGINE)
+    "builtin": 組み込みのpow(a,-1,p)
+    "euclid" : 拡張ユークリッドの互除法
+    "fermat" : フェルマーの小定理 1/a = a**(p - 2) (mod p)
     
     @param a:int
     @param p:int
+    @param engine:str
     @return:int 
     """
     assert isinstance(a,int)
@@ -72,7 +161,39 @@ def inv(a,p):
     #assert is_prime(p) HACK: assertを切らないと、ここで時間がかかりすぎる。
     assert a%p != 0
     
-    if a < 0:# aが負の場合、正数にまず変換。
-        return sq_and_mul(a%p,p-2,p)
+    if engine is None:
+        engine = INV_ENGINE
+    
+    if engine == "builtin":
+        return pow(a,-1,p)
+    elif engine == "euclid":
+        return _inv_euclid(a%p,p)
+    elif engine == "fermat":
+        return sq_and_mul(a%p,p-2,p) # aが負の場合、正数にまず変換。
     else:
-        return sq_and_mul(a,p-2,p)
+        raise ValueError("unknown engine: %s"%(engine))
+
+def batch_inverse(elements):
+    """
+    Fq或いはFq2の元のリストelementsの各元の逆元のリストを計算。
+    Montgomery's trickにより、逆元の計算は一回だけで、残りは高々3(n-1)回の乗算で済む。
+    
+    @param elements:list 0でないFq或いはFq2の元のリスト
+    @return:list
+    """
+    n = len(elements)
+    if n == 0:
+        return []
+    
+    # prefix[i] = elements[0]*...*elements[i]
+    prefix = [elements[0]]
+    for z in elements[1:]:
+        prefix.append(prefix[-1]*z)
+    
+    t = 1/prefix[-1] # = 1/(elements[0]*...*elements[i])
+    result = [None]*n
+    for i in range(n - 1,0,-1):
+        result[i] = t*prefix[i - 1]
+        t = t*elements[i]
+    result[0] = t
+    return result
@@ -1,10 +1,12 @@
 """
 Ref: An Introduction to Mathematical Cryptography,Chapter 6 --- (1)
 """
+import multiprocessing
+
 from .ec import EC
 from .fq import Fq
-from .fq2 import Fq2
-from .misc import rand_between,sq_and_mul
+from .fq2 import Fq2,GT,_mul_ints,_square_ints,_lin_comb
+from .misc import rand_between,sq_and_mul,wnaf
 
 def g_pq(ec,p,q,r):
     """
@@ -28,7 +30,8 @@ def g_pq(ec,p,q,r):
         if(p.y == 0):  # Vertical
             return r.x - p.x
         else:          # Non-Vertical Tangent
-            l = (3*(p.x**2) + ec.a)/(2*p.y)
+            xx = p.x.square()
+            l = (xx + xx + xx + ec.a)/(p.y + p.y)
     elif(p.x == q.x): # Vertical
         return r.x - p.x
     else:             # Non-Vertical
@@ -44,6 +47,54 @@ def miller(ec,p,m,r):
     div(f_p) = m[P] - [mP] - (m-1)[inf]を満たす関数f_p(r)を 
     Miller's algorithmを使用して計算。
     
+    点をJacobian座標で保持し、fを分子と分母に分けて累積することで、
+    割り算を最後の一回だけにする。戻り値はmiller_affineと完全に一致する。
+    
+    @param ec:EC
+    @param p:Point
+    @param m:int
+    @param r:Point
+    @return: fq or fq2
+    """
+    
+    numer,denom = _miller_frac(ec,p,m,r)
+    return numer/denom
+
+def _miller_frac(ec,p,m,r):
+    """
+    millerと同じ値を、割り算をせずに分子と分母の組(numer,denom)として返す。
+    """
+    assert isinstance(ec,EC)
+    assert isinstance(m,int)
+    assert p is not None and isinstance(p,ec.point)
+    assert r is not None and isinstance(r,ec.point)
+    
+    numer = ec._one
+    denom = ec._one
+    for d,dbl,add in _miller_lines(ec,p,m):
+        numer,denom = _accumulate(numer.square(),denom.square(),dbl,r)
+        if add is not None:
+            numer,denom = _accumulate(numer,denom,add,r)
+    return numer,denom
+
+def _accumulate(numer,denom,step,r):
+    """
+    numer/denom に g_pq(r) = (line(r)*sn)/(vert(r)*sd)を掛ける。(Noneは1を表す)
+    """
+    line,vert,sn,sd = step
+    numer = numer*_eval_line(line,r)
+    if sn is not None: numer = numer*sn
+    if vert is not None: denom = denom*_eval_vert(vert,r.x)
+    if sd is not None: denom = denom*sd
+    return numer,denom
+
+def miller_affine(ec,p,m,r):
+    """    
+    (1) Theorem 6.41(b)
+    div(f_p) = m[P] - [mP] - (m-1)[inf]を満たす関数f_p(r)を 
+    Miller's algorithmを使用して計算。
+    アフィン座標を使用し、各ステップで割り算を行う参照実装。
+    
     @param ec:EC
     @param p:Point
     @param m:int
@@ -69,17 +120,319 @@ def miller(ec,p,m,r):
             t = ec.add(t,p)
     return f
     
-def weil_pairing(ec,p,q,s,m):
+def miller_naf(ec,p,m,r):
+    """
+    millerと同じ関数f_p(r)を計算するが、mを符号付き2進数(NAF)で表現し、
+    加算ステップの回数を(平均で)ビット長の1/2から1/3に減らす。
+    桁が-1の場合は
+    f_{a-1} = f_a * g_{aP,-P} / v_P
+    を使用する、ここでv_Pは点Pを通る垂直線。
+    
+    @param ec:EC
+    @param p:Point
+    @param m:int
+    @param r:Point
+    @return: fq or fq2
+    """
+    
+    assert isinstance(ec,EC)
+    assert isinstance(m,int)
+    assert m > 0
+    assert p is not None and isinstance(p,ec.point)
+    assert r is not None and isinstance(r,ec.point)
+
+    neg_p = ec.neg(p)
+    v_p = r.x - p.x
+    
+    t = p
+    f = 1
+    digits = wnaf(m,2)
+    for i in range(len(digits)-2,-1,-1):
+        f = (f*f)*g_pq(ec,t,t,r)
+        t = ec.add(t,t)
+        if(digits[i] == 1):
+            f = f*g_pq(ec,t,p,r)
+            t = ec.add(t,p)
+        elif(digits[i] == -1):
+            f = f*g_pq(ec,t,neg_p,r)/v_p
+            t = ec.add(t,neg_p)
+    return f
+
+def _in_base_field(ec,p):
+    """
+    Fq2上の楕円曲線ecの点pの座標がFqの元か否かを判定。
+    Fq2ではFqの元nは(-n,-n)と表されることに注意。
+    """
+    return p.x.x() == p.x.y() and p.y.x() == p.y.y()
+
+def _double_step(ec,t):
+    """
+    Miller's algorithmの2倍算ステップ。
+    Jacobian座標の点tに対して([2]t,(line,vert,sn,sd))を返す、ここで
+    line = (cy,cx,c0)はtにおける接線 cy*y + cx*x + c0、
+    vert = (vx,v0)は[2]tを通る垂直線 vx*x + v0 の係数
+    (それぞれJacobian座標の分母を払ったもの)であり、sn,sdはその分母。
+    つまり g_pq(t,t,r) = (line(r)*sn)/(vert(r)*sd)。(Noneは1を表す)
+    """
+    X,Y,Z = t
+    ZZ = Z*Z
+    if(Y == 0): # 垂直な接線、[2]t = 無限遠点。
+        return None,((None,ZZ,-X),None,None,ZZ)
+    
+    # 整数倍は加算で計算する。(ec._jacobian_doubleと同様)
+    YY = Y.square()
+    XX = X.square()
+    M = XX + XX + XX
+    if(ec.a != 0):
+        M = M + ec.a*(ZZ*ZZ)
+    S = X*YY
+    S = S + S
+    S = S + S
+    Y8 = YY.square()
+    Y8 = Y8 + Y8
+    Y8 = Y8 + Y8
+    X3 = M.square() - S - S
+    Y3 = M*(S - X3) - Y8 - Y8
+    Z3 = Y*Z
+    Z3 = Z3 + Z3
+
+    # 接線: (y - Y/Z^3) - M/(2YZ)*(x - X/Z^2) = line/(Z3*ZZ)
+    # 垂直線: x - X3/Z3^2 = vert/Z3^2
+    line = (Z3*ZZ,-(M*ZZ),M*X - YY - YY)
+    vert = (Z3*Z3,-X3)
+    return (X3,Y3,Z3),(line,vert,Z3,ZZ)
+
+def _add_step(ec,t,p):
+    """
+    Miller's algorithmの加算ステップ。
+    Jacobian座標の点tとアフィン座標の点pに対して(t + p,(line,vert,sn,sd))を返す、ここで
+    line = (cy,cx,c0)はtとpを通る直線 cy*y + cx*x + c0、
+    vert = (vx,v0)はt + pを通る垂直線 vx*x + v0 の係数
+    (それぞれJacobian座標の分母を払ったもの)であり、sn,sdはその分母。
+    つまり g_pq(t,p,r) = (line(r)*sn)/(vert(r)*sd)。(Noneは1を表す)
+    """
+    X,Y,Z = t
+    ZZ = Z*Z
+    H = p.x*ZZ - X
+    R = p.y*(Z*ZZ) - Y
+    if(H == 0):
+        if(R == 0): # t == p
+            return _double_step(ec,t)
+        else:       # t == -p、垂直線。
+            return None,((None,ec._one,-p.x),None,None,None)
+        
+    HH = H*H
+    HHH = H*HH
+    V = X*HH
+    X3 = R.square() - HHH - V - V
+    Y3 = R*(V - X3) - Y*HHH
+    Z3 = Z*H
+
+    # 直線: (y - y_p) - R/Z3*(x - x_p) = line/Z3
+    # 垂直線: x - X3/Z3^2 = vert/Z3^2
+    line = (Z3,-R,R*p.x - Z3*p.y)
+    vert = (Z3*Z3,-X3)
+    return (X3,Y3,Z3),(line,vert,Z3,None)
+
+def _eval_line(line,r):
+    """
+    直線 cy*y + cx*x + c0 を点rで評価する。
+    """
+    cy,cx,c0 = line
+    if r.x.name() == "fq2" and cy is not None:
+        return _lin_comb(r.x.__class__,[(cx,r.x),(cy,r.y)],c0)
+    
+    v = cx*r.x + c0
+    if cy is not None: v = v + cy*r.y
+    return v
+
+def _eval_vert(vert,x):
+    """
+    垂直線 vx*x + v0 をx座標xで評価する。
+    """
+    vx,v0 = vert
+    return vx*x + v0
+
+def _miller_lines(ec,p,m,naf=False):
+    """
+    Miller's algorithmの各ステップで使う直線の係数を順に返すジェネレータ。
+    (d,dbl,add)を返す、ここでdはmの桁(0,1或いは-1)、
+    dbl,addはそれぞれ2倍算ステップ、加算ステップの(line,vert,sn,sd)。
+    (d == 0の場合add = None)
+    
+    @param ec:EC
+    @param p:Point
+    @param m:int
+    @param naf:bool Trueの場合、mを符号付き2進数(NAF)で表現する。
+    """
+    if naf:
+        digits = wnaf(m,2)[-2::-1]
+    else:
+        digits = [int(b) for b in "{:b}".format(m)[1:]]
+
+    neg_p = ec.neg(p)
+    t = ec._to_jacobian(p)
+    for d in digits:
+        t,dbl = _double_step(ec,t)
+        add = None
+        if(d == 1):
+            t,add = _add_step(ec,t,p)
+        elif(d == -1):
+            t,add = _add_step(ec,t,neg_p)
+        yield d,dbl,add
+
+def _base_lines(ec,lines):
+    """
+    _miller_linesが返す直線の係数(座標がFqの元である点の場合、全てFqの元)を、
+    Fqの値を表す整数に変換するジェネレータ。
+    (d,dbl,add)を返す、ここでdbl,addは((ly,lx,l0),vert)で、vert = (vx,v0)或いはNone。
+    """
+    q = ec.ff.modulo()
+    base = lambda c: None if c is None else (-c.x().val()) % q # (-n,-n) => n
+    for d,dbl,add in lines:
+        steps = []
+        for step in (dbl,add):
+            if step is not None:
+                (cy,cx,c0),vert,_,_ = step
+                if vert is not None:
+                    vert = (base(vert[0]),base(vert[1]))
+                step = ((base(cy),base(cx),base(c0)),vert)
+            steps.append(step)
+        yield d,steps[0],steps[1]
+
+def _miller_eval(ec,items):
+    """
+    _base_linesが返す直線の係数を使って、miller_reducedの値の積を計算する。
+    itemsは(p,lines,r)のリストで、各linesの桁は揃っている必要がある。
+    fの2乗は全てのitemで共有される。
+    垂直線で割る代わりに、その共役を掛ける。
+    fと直線の値は整数の組として計算し、各座標で一回だけmod qを取る。
+    """
+    q = ec.ff.modulo()
+    states = []
+    for p,lines,r in items:
+        x = (r.x.x().val(),r.x.y().val())
+        y = (r.y.x().val(),r.y.y().val())
+        x_conj = (x[1],x[0])
+        conj_v_p = (x_conj[0] - p.x.x().val(),x_conj[1] - p.x.y().val()) # 1/v_p(r)の代わり。
+        states.append((x,y,x_conj,conj_v_p))
+    
+    fa,fb = q - 1,q - 1 # 1
+    for steps in zip(*[lines for _,lines,_ in items]):
+        fa,fb = _square_ints(fa,fb)
+        fa,fb = fa % q,fb % q
+        for (d,dbl,add),(x,y,x_conj,conj_v_p) in zip(steps,states):
+            ga,gb = _reduced_factor(dbl,x,y,x_conj,q)
+            fa,fb = _mul_ints(fa,fb,ga,gb)
+            fa,fb = fa % q,fb % q
+            if add is not None:
+                ga,gb = _reduced_factor(add,x,y,x_conj,q)
+                if(d == -1):
+                    ga,gb = _mul_ints(ga,gb,conj_v_p[0],conj_v_p[1])
+                    ga,gb = ga % q,gb % q
+                fa,fb = _mul_ints(fa,fb,ga,gb)
+                fa,fb = fa % q,fb % q
+    return ec.ff._make(fa,fb)
+
+def _reduced_factor(step,x,y,x_conj,q):
+    """
+    g_pq(r)の代わりに line(r)*conj(vert(r)) を整数の組として返す。
+    (vertの係数はFqの元なので conj(vert(r)) = vert(conj(x_r)))
+    x,y,x_conjはそれぞれr.x,r.y,conj(r.x)の座標の整数の組。
+    Fqの値nはFq2では(-n,-n)と表されるので、n*(a,b) = (n*a,n*b)、(a,b) + n = (a - n,b - n)。
+    """
+    (ly,lx,l0),vert = step
+    ga = lx*x[0] - l0
+    gb = lx*x[1] - l0
+    if ly is not None:
+        ga += ly*y[0]
+        gb += ly*y[1]
+    if vert is not None:
+        vx,v0 = vert
+        ga,gb = _mul_ints(ga,gb,vx*x_conj[0] - v0,vx*x_conj[1] - v0)
+    return ga % q,gb % q
+    
+def miller_reduced(ec,p,m,r,naf=False):
+    """
+    Reduced pairing(最終冪を行うpairing)用のMiller's algorithm。
+    pの座標がFqの元、rの座標がFq2の元(e.g. distortion mapの像)である場合に使用する。
+    
+    戻り値はmillerの戻り値とFqの元倍だけ異なるが、
+    Fqの元は最終冪 (q^2 - 1)/m (q - 1を因数にもつ)で1になるため、
+    最終冪の後の値はmillerを使用した場合と一致する。
+    これを利用して、
+    (1) 垂直線(分母)vで割る代わりに、その共役を掛ける。(1/v = conj(v)/(v*conj(v))、v*conj(v)はFqの元)
+    (2) 点をJacobian座標で保持し、直線の傾きの分母(Fqの元)を払う。
+    ことで、ループ内の逆元の計算を全て無くす。
+    
+    @param ec:EC Fq2上の楕円曲線
+    @param p:Point 座標がFqの元である点
+    @param m:int
+    @param r:Point
+    @param naf:bool Trueの場合、mを符号付き2進数(NAF)で表現する。
+    @return: fq2
+    """
+    
+    assert isinstance(ec,EC)
+    assert ec.ff.name() == "fq2"
+    assert isinstance(m,int)
+    assert m > 0
+    assert p is not None and isinstance(p,ec.point)
+    assert r is not None and isinstance(r,ec.point)
+    assert _in_base_field(ec,p)
+
+    return _miller_eval(ec,[(p,_base_lines(ec,_miller_lines(ec,p,m,naf)),r)])
+
+class PreparedPoint:
+    """
+    Pairingの第一引数として固定された点pに対して、
+    Miller's algorithmの直線の係数を事前計算したもの。
+    直線は点pの倍数のみに依存するので、以後のPairingでは
+    直線を評価するだけでよく、点の演算は一切必要ない。
+    (tate_pairingの第一引数として使用できる)
+    """
+    def __init__(self,ec,p,m,naf=False):
+        """
+        @param ec:EC Fq2上の楕円曲線
+        @param p:Point 座標がFqの元である点
+        @param m:int ループ長
+        @param naf:bool Trueの場合、mを符号付き2進数(NAF)で表現する。
+        """
+        assert isinstance(ec,EC)
+        assert ec.ff.name() == "fq2"
+        assert isinstance(m,int)
+        assert m > 0
+        assert p is not None and isinstance(p,ec.point)
+        assert _in_base_field(ec,p)
+        
+        self.ec = ec
+        self.p = p
+        self.m = m
+        self.naf = naf
+        self.lines = list(_base_lines(ec,_miller_lines(ec,p,m,naf)))
+
+    def miller(self,r):
+        """
+        miller_reduced(ec,p,m,r)と同じ値を計算。
+        @param r:Point
+        @return: fq2
+        """
+        assert r is not None and isinstance(r,self.ec.point)
+        return _miller_eval(self.ec,[(self.p,self.lines,r)])
+    
+def weil_pairing(ec,p,q,s,m,pool=None):
     """
     Weil pairing e_m(P,Q) := (f_P(Q+S)/f_P(S)) / (f_Q(P-S)/f_Q(-S))
     　を計算。
     f_Pとf_QはMiller's algorithmによって返された関数。
+    mがq+1を割る場合(e.g. Modified Weil pairing)は、戻り値はGTの元。
     
     @param ec:EC
     @param p:Point
     @param q:Point
     @param s:Point
     @param m:int
+    @param pool:PairingPool 指定した場合、4つのMiller's algorithmをワーカープロセスで並列に計算する。
     @return: fq or fq2
     """
     
@@ -93,13 +446,249 @@ def weil_pairing(ec,p,q,s,m):
     ps = ec.sub(p,s)
     neg_s = ec.neg(s)
 
-    f_p_qs = miller(ec,p,m,qs)
-    f_p_s = miller(ec,p,m,s)
+    # 各f = n/dを分子と分母に分けて計算し、割り算を一度だけにする。
+    tasks = [(p,qs),(p,s),(q,ps),(q,neg_s)]
+    if pool is None:
+        fracs = [_miller_frac(ec,t,m,r) for t,r in tasks]
+    else:
+        fracs = pool._miller_fracs(ec,tasks,m)
+    (n_p_qs,d_p_qs),(n_p_s,d_p_s),(n_q_ps,d_q_ps),(n_q_neg_s,d_q_neg_s) = fracs
 
-    f_q_ps = miller(ec,q,m,ps)
-    f_q_neg_s = miller(ec,q,m,neg_s)
+    numer = (n_p_qs*d_p_s)*(d_q_ps*n_q_neg_s)
+    denom = (d_p_qs*n_p_s)*(n_q_ps*d_q_neg_s)
+    
+    return _to_gt(ec,numer/denom,m)
 
-    numer = f_p_qs/f_p_s
-    denom = f_q_ps/f_q_neg_s
+def _to_gt(ec,z,m):
+    """
+    位数がq+1を割るmであるFq2の元zを、unitaryな元のクラス(GT)に変換する。
+    (それ以外の場合はそのまま返す)
+    """
+    if ec.ff.name() == "fq2" and (ec.modulo() + 1) % m == 0:
+        return GT(ec.ff)._make(z._a,z._b)
+    return z
+
+def tate_pairing(ec,p,q,m,naf=False):
+    """
+    Reduced Tate pairing t_m(P,Q) := f_P(Q)^((q^k - 1)/m) を計算。
+    ここでkは埋め込み次数(Fq2上ならk=2、Fq上ならk=1)。
+    Weil pairingとは異なり、Miller's algorithmは一度だけでよく、
+    補助的なランダムな点も必要ない。
+    Pの座標がFqの元である場合は、逆元を使わないmiller_reducedを使用する。
+    pとしてPreparedPointを渡すと、事前計算した直線の係数を使用する。
     
-    return numer/denom
+    k=2の場合、q^2 - 1 = (q-1)(q+1)と分解し、
+    f^(q-1) = f^q/f = (Frobenius写像)/f を利用して計算量を減らす。
+    
+    @param ec:EC
+    @param p:Point or PreparedPoint
+    @param q:Point
+    @param m:int
+    @param naf:bool Trueの場合、mを符号付き2進数(NAF)で表現し、加算ステップを減らす。
+                    (値は変わらない。PreparedPointの場合は作成時のnafが使われる)
+    @return: fq or fq2
+    """
+    
+    assert isinstance(ec,EC)
+    assert isinstance(m,int)
+    assert q is not None and isinstance(q,ec.point)
+
+    if isinstance(p,PreparedPoint):
+        assert p.ec == ec and p.m == m
+        f = p.miller(q)
+    elif ec.ff.name() == "fq2" and _in_base_field(ec,p):
+        f = miller_reduced(ec,p,m,q,naf)
+    elif naf:
+        f = miller_naf(ec,p,m,q)
+    else:
+        f = miller(ec,p,m,q)
+    return _final_exp(ec,f,m)
+
+def _final_exp(ec,f,m):
+    """
+    Tate pairingの最終冪 f^((q^k - 1)/m) を計算。
+    
+    @param ec:EC
+    @param f:fq or fq2
+    @param m:int
+    @return: fq or fq2
+    """
+    q = ec.modulo()
+    if ec.ff.name() == "fq2":
+        if (q + 1) % m == 0:
+            f = f.conj()/f # f^(q-1) = f^q/f、これはunitaryな元。
+            return _to_gt(ec,f,m)**((q + 1)//m)
+        else:
+            return f**((q*q - 1)//m)
+    else:
+        return f**((q - 1)//m)
+
+def multi_pairing(ec,pairs,m,naf=True,pool=None):
+    """
+    Reduced Tate pairingの積 prod(tate_pairing(ec,p_i,q_i,m)) を計算。
+    全てのペアのMiller's algorithmを同時に進めてfの2乗を共有し、
+    最終冪も一度だけ行うため、tate_pairingをn回呼ぶより大幅に速い。
+    
+    @param ec:EC Fq2上の楕円曲線
+    @param pairs:[(p_1,q_1),...] p_iは座標がFqの元である点或いはPreparedPoint
+    @param m:int
+    @param naf:bool Trueの場合、mを符号付き2進数(NAF)で表現する。
+                    (PreparedPointは同じnafで作成されている必要がある)
+    @param pool:PairingPool 指定した場合、ペアをワーカー数に分割してMiller's algorithmを並列に計算し、
+                            それらの積に最終冪を一度だけ行う。
+    @return: fq2
+    """
+    assert isinstance(ec,EC)
+    assert ec.ff.name() == "fq2"
+    assert isinstance(m,int)
+    assert m > 0
+    
+    pairs = list(pairs)
+    for p,q in pairs:
+        assert q is not None and isinstance(q,ec.point)
+        if isinstance(p,PreparedPoint):
+            assert p.ec == ec and p.m == m and p.naf == naf
+        else:
+            assert p is not None and isinstance(p,ec.point)
+            assert _in_base_field(ec,p)
+
+    if pool is None or len(pairs) < 2:
+        f = _miller_eval(ec,_multi_items(ec,pairs,m,naf))
+    else:
+        k = min(pool.processes,len(pairs))
+        f = ec._one
+        for g in pool._miller_evals(ec,[pairs[i::k] for i in range(k)],m,naf):
+            f = f*g
+    return _final_exp(ec,f,m)
+
+def _multi_items(ec,pairs,m,naf):
+    """
+    multi_pairingのペアのリストから、_miller_evalに渡す(p,lines,q)のリストを作る。
+    """
+    items = []
+    for p,q in pairs:
+        if isinstance(p,PreparedPoint):
+            items.append((p.p,p.lines,q))
+        else:
+            items.append((p,_base_lines(ec,_miller_lines(ec,p,m,naf)),q))
+    return items
+
+_pool_state = None # PairingPoolのワーカープロセスが保持する(ec,m,pairing)
+
+def _pool_init(ec,m,pairing):
+    """
+    PairingPoolのワーカープロセスの初期化。
+    楕円曲線とパラメータは起動時に一度だけ受け取り、以後のタスクでは送らない。
+    """
+    global _pool_state
+    _pool_state = (ec,m,pairing)
+
+def _pool_pairing(pair):
+    """
+    ワーカープロセスで pairing(ec,p,q,m) を計算する。
+    """
+    ec,m,pairing = _pool_state
+    p,q = pair
+    return pairing(ec,p,q,m)
+
+def _pool_curve(ext):
+    """
+    ワーカープロセスが保持する楕円曲線(ext == Trueの場合はそのFq2上への拡大)を返す。
+    """
+    ec = _pool_state[0]
+    return ec.extension() if ext else ec
+
+def _pool_miller_frac(task):
+    """
+    ワーカープロセスで _miller_frac(ec,p,m,r) を計算する。(weil_pairing用)
+    """
+    ext,p,m,r = task
+    return _miller_frac(_pool_curve(ext),p,m,r)
+
+def _pool_miller_eval(task):
+    """
+    ワーカープロセスでペアのリストに対する_miller_evalを計算する。(multi_pairing用)
+    """
+    ext,pairs,m,naf = task
+    ec = _pool_curve(ext)
+    return _miller_eval(ec,_multi_items(ec,pairs,m,naf))
+
+class PairingPool:
+    """
+    複数の(P,Q)のPairingを、プロセスプールを使って並列に計算するクラス。
+    楕円曲線ec、位数m、pairing関数はワーカーの起動時に一度だけ送られる。
+    weil_pairing,multi_pairingのpoolとして渡すと、一つのPairingの中の独立な
+    Miller's algorithmを並列に計算する。(ecがFq上の楕円曲線の場合、そのFq2上への拡大でも使用できる)
+    
+    with PairingPool(ec,m,pairing) as pool:
+        values = pool.map(pairs)
+    """
+    def __init__(self,ec,m,pairing=tate_pairing,processes=None,chunksize=None):
+        """
+        @param ec:EC
+        @param m:int
+        @param pairing: pairing(ec,p,q,m)の形の関数(モジュールレベルの関数であること)
+                        e.g. tate_pairing,ibc.modified_weil_pairing
+        @param processes:int ワーカー数(Noneの場合はCPUの数)
+        @param chunksize:int 一度にワーカーへ送るペアの数(Noneの場合は自動)
+        """
+        assert isinstance(ec,EC)
+        assert isinstance(m,int)
+        assert processes is None or (isinstance(processes,int) and processes > 0)
+        assert chunksize is None or (isinstance(chunksize,int) and chunksize > 0)
+        
+        self.ec = ec
+        self.m = m
+        self.pairing = pairing
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunksize = chunksize
+        self._pool = multiprocessing.Pool(self.processes,_pool_init,(ec,m,pairing))
+
+    def map(self,pairs):
+        """
+        各(p,q)に対する pairing(ec,p,q,m) のリストを、pairsと同じ順番で返す。
+        
+        @param pairs:[(p_1,q_1),...]
+        @return:list
+        """
+        pairs = list(pairs)
+        chunksize = self.chunksize
+        if chunksize is None:
+            chunksize = max(1,-(-len(pairs)//(4*self.processes)))
+        return self._pool.map(_pool_pairing,pairs,chunksize)
+
+    def _ext(self,ec):
+        """
+        ecがワーカーの保持する楕円曲線の場合False、そのFq2上への拡大の場合Trueを返す。
+        """
+        if ec == self.ec:
+            return False
+        assert self.ec.ff.name() == "fq" and ec == self.ec.extension()
+        return True
+
+    def _miller_fracs(self,ec,tasks,m):
+        """
+        各(p,r)に対する_miller_frac(ec,p,m,r)を、一つずつ別のワーカーで計算する。
+        """
+        ext = self._ext(ec)
+        return self._pool.map(_pool_miller_frac,[(ext,p,m,r) for p,r in tasks],1)
+
+    def _miller_evals(self,ec,groups,m,naf):
+        """
+        ペアのリストの各グループに対する_miller_evalを、一つずつ別のワーカーで計算する。
+        """
+        ext = self._ext(ec)
+        return self._pool.map(_pool_miller_eval,[(ext,pairs,m,naf) for pairs in groups],1)
+
+    def close(self):
+        """
+        ワーカープロセスを終了する。
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
@@ -1,5 +1,6 @@
 from ibc.ec import *
 
+import pickle
 import unittest
 
 class TestEC(unittest.TestCase):    
@@ -21,6 +22,85 @@ class TestEC(unittest.TestCase):
         q = ec.point(fq(39),fq(17))
         r = ec.double_and_add(11,p)        
         self.assertEqual(r,q)
-    
+
+    def test_jacobian(self):
+        # Jacobian座標によるスカラー倍と、アフィン座標での加算を繰り返した結果を比較。
+        for a,b,q,x,y in [(8,7,73,32,53),(0,1,89,2,3)]:
+            fq = Fq(q)
+            ec = EC(fq(a),fq(b),fq)
+            p = ec.point(fq(x),fq(y))
+            self.assertTrue(ec.on_curve(p))
+            
+            r = None
+            for n in range(1,2*q):
+                r = ec.add(r,p)
+                self.assertEqual(ec.double_and_add(n,p),r)
+
+    def test_fixed_base(self):
+        fq = Fq(89)
+        ec = EC(fq(0),fq(1),fq)
+        p = ec.point(fq(2),fq(3))
+        for window in range(1,5):
+            table = FixedBase(ec,p,8,window=window)
+            for n in range(-300,300):
+                self.assertEqual(table.mul(n),ec.double_and_add(n,p))
+                
+        table = ec.fixed_base(p,bits=8,budget=20)
+        self.assertIs(table,ec.fixed_base(p,bits=8))
+        self.assertTrue(table.size() <= 20)
+
+    def test_wnaf(self):
+        for width in range(2,7):
+            for n in range(0,1000):
+                digits = wnaf(n,width)
+                self.assertEqual(sum(d << i for i,d in enumerate(digits)),n)
+                for i,d in enumerate(digits):
+                    if d != 0:
+                        self.assertTrue(d % 2 == 1 and abs(d) < (1 << (width-1)))
+                        self.assertTrue(all(e == 0 for e in digits[i+1:i+width]))
+                        
+        # double_and_add(参照実装)との比較。
+        for a,b,q,x,y in [(8,7,73,32,53),(0,1,89,2,3)]:
+            fq = Fq(q)
+            ec = EC(fq(a),fq(b),fq)
+            p = ec.point(fq(x),fq(y))
+            for width in range(2,6):
+                for n in range(-2*q,2*q):
+                    self.assertEqual(ec.wnaf_mul(n,p,width),ec.double_and_add(n,p))
+
+    def test_pickle(self):
+        # 同じパラメータに対しては同じクラスが返り、pickleで元に戻る。
+        self.assertIs(Fq(89),Fq(89))
+        self.assertIs(Fq2(Fq(89)),Fq2(Fq(89)))
+        self.assertIs(Point(Fq(89)),Point(Fq(89)))
+        
+        fq = Fq(89)
+        ec = EC(fq(0),fq(1),fq)
+        ec.wnaf_width = 3
+        p = ec.point(fq(2),fq(3))
+        ext = ec.extension()
+        for obj in [fq,fq(5),p,ext.ff(1,2),ec.lift(p)]:
+            self.assertEqual(pickle.loads(pickle.dumps(obj)),obj)
+        
+        ec2 = pickle.loads(pickle.dumps(ec))
+        self.assertEqual(ec2,ec)
+        self.assertIs(ec2.point,ec.point)
+        self.assertEqual(ec2.wnaf_width,3)
+        self.assertEqual(ec2.mul(7,p),ec.mul(7,p))
+        self.assertNotEqual(ec2,EC(fq(0),fq(2),fq))
+
+    def test_point_hash(self):
+        fq = Fq(89)
+        ec = EC(fq(0),fq(1),fq)
+        p = ec.point(fq(2),fq(3))
+        with self.assertRaises(AttributeError):
+            p.x = fq(0)
+        self.assertFalse(hasattr(p,"__dict__"))
+        
+        # 他のクラスの点(e.g. Fq2上へ持ち上げた点)やNoneとは等しくない。(例外にならない)
+        self.assertFalse(p == ec.lift(p))
+        self.assertTrue(p != None)
+        self.assertEqual(len({p,ec.point(fq(2),fq(3)),ec.lift(p),None}),3)
+        
 if __name__ == '__main__':
     unittest.main()        
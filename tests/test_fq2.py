@@ -1,4 +1,6 @@
 from ibc.fq2 import *
+from ibc.fq2 import _lin_comb
+from ibc.misc import inv,batch_inverse
 from random import randint
 
 import unittest
@@ -40,6 +42,179 @@ class TestFq2(unittest.TestCase):
             self.assertEqual(x**3,x*x*x)
             self.assertEqual(x**4,x*x*x*x)
 
+    def test_fixed_base_pow(self):
+        q = 889673
+        fq2 = Fq2(Fq(q))
+        g = fq2(randint(0,q-1),randint(0,q-1))
+        for window in range(1,6):
+            table = FixedBasePow(g,20,window)
+            for e in [0,1,2,3,(1 << 20) - 1,(1 << 25) + 3] + [randint(0,1 << 20) for i in range(20)]:
+                self.assertEqual(table.pow(e),g**e if e > 0 else fq2.int_to_fq2(1))
+            self.assertEqual(table.pow(-5)*(g**5),1)
+            self.assertTrue(table.nbytes() > 0)
+
+        # GTの元の場合は、e = 0を含めて常にGTの元を返す。
+        gt = GT(fq2)
+        z = g**(q - 1)
+        table = FixedBasePow(gt(z.x(),z.y()),20)
+        for e in [0,1,-3,12345]:
+            self.assertEqual(type(table.pow(e)),gt)
+        self.assertTrue(table.pow(0).compress().is_one())
+
+    def test_square(self):
+        q = 889673
+        fq2 = Fq2(Fq(q))
+        for i in range(20):
+            x = fq2(randint(0,q-1),randint(0,q-1))
+            y = fq2(randint(0,q-1),randint(0,q-1))
+            a,b = x.x().val(),x.y().val()
+            c,d = y.x().val(),y.y().val()
+            self.assertEqual(x*y,fq2(b*d - a*d - b*c,a*c - a*d - b*c))
+            self.assertEqual(x.square(),x*x)
+            self.assertEqual(x.conj(),x**q)
+            self.assertEqual(x**5,x*x*x*x*x)
+            self.assertEqual(_lin_comb(fq2,[(x,y),(y,y)],x),x*y + y.square() + x)
+
+    def test_slots(self):
+        q = 889673
+        fq = Fq(q)
+        fq2 = Fq2(fq)
+        x = fq2(q + 5,fq(7))
+        self.assertFalse(hasattr(x,"__dict__"))
+        self.assertEqual(x.x(),5)
+        self.assertEqual(x.y(),7)
+        self.assertEqual(x.x().name(),"fq")
+        self.assertEqual(x*fq(3),x*3)
+        self.assertEqual(x/3*3,x)
+        self.assertEqual(1/x*x,1)
+        self.assertTrue(sizeof(x) < 200)
+
+        y = fq2(5,7)
+        y *= x
+        self.assertEqual(y,x.square())
+
+        # _makeは検査を省略するが、通常のコンストラクタと同じ元を返す。
+        gt = GT(fq2)
+        self.assertEqual(fq2._make(5,7),fq2(5,7))
+        self.assertEqual(type(fq2._make(5,7)),fq2)
+        self.assertEqual(type(gt._make(q - 1,q - 1)),gt)
+        self.assertEqual(type(gt.one().conj()),gt)
+        self.assertEqual(type(gt.one() + gt.one()),fq2)
+
+    def test_hash(self):
+        q = 889673
+        fq = Fq(q)
+        fq2 = Fq2(fq)
+        a = fq(5)
+        with self.assertRaises(AttributeError):
+            a._n = 6
+        b = a
+        b += 1
+        self.assertEqual(a,5)
+        self.assertEqual(b,6)
+        self.assertEqual(3 - a,q - 2)
+
+        # 等しい元はhash値も等しい。
+        self.assertEqual(len({a,fq(q + 5),5}),1)
+        self.assertEqual(len({fq2(-5,-5),a,fq2(1,2),fq2(q + 1,2)}),2)
+        self.assertEqual({fq2(1,2):"x"}[fq2(1,2)],"x")
+
+        x = fq2(1,2)
+        with self.assertRaises(AttributeError):
+            x._a = 3
+        # 他の型とは等しくない。(例外にならない)
+        self.assertFalse(a == "a")
+        self.assertTrue(a != None)
+        self.assertFalse(x == None)
+        self.assertTrue(x != "a")
+        self.assertEqual(len({a,x,"a",None}),4)
+
+    def test_batch_inverse(self):
+        q = 889673
+        fq = Fq(q)
+        fq2 = Fq2(fq)
+        for engine in ["builtin","euclid","fermat"]:
+            a = randint(-q,q)
+            if a%q == 0: continue
+            self.assertEqual(inv(a,q,engine)*a%q,1)
+        
+        xs = [fq(randint(1,q-1)) for i in range(10)]
+        self.assertEqual(batch_inverse(xs),[1/x for x in xs])
+        zs = [fq2(randint(1,q-1),randint(0,q-1)) for i in range(10)]
+        self.assertEqual(batch_inverse(zs),[1/z for z in zs])
+        self.assertEqual(batch_inverse(zs[:1]),[1/zs[0]])
+        self.assertEqual(batch_inverse([]),[])
+
+    def test_gt(self):
+        q = 889673
+        fq2 = Fq2(Fq(q))
+        gt = GT(fq2)
+        for i in range(20):
+            z = fq2(randint(0,q-1),randint(0,q-1))**(q-1) # ノルムが1の元。
+            x = gt(z.x(),z.y())
+            self.assertTrue(x.is_unitary())
+            self.assertEqual(x.conj()*x,1)
+            self.assertEqual(1/x,x.conj())
+            self.assertEqual(x.square(),z*z)
+            
+            e = randint(-q,q)
+            self.assertEqual(x**e,z**e if e > 0 else (1/z)**(-e) if e < 0 else 1)
+            self.assertTrue((x**e).is_unitary())
+            
+            self.assertEqual(x.pow_naf(e),x**e)
+            self.assertEqual(x.pow_lucas(e),x**e)
+            self.assertEqual(x.pow_trace(e),(x**e).trace())
+            
+            # unitaryでない元との積はFq2になる。
+            self.assertEqual(type(x*fq2(1,2)),fq2)
+            self.assertEqual(type(x*x),gt)
+
+        one = gt.one()
+        self.assertEqual(one.pow_lucas(12345),1)
+        self.assertEqual(gt(1,1).pow_lucas(12345),-1) # -1 = (1,1)
+
+    def test_t2(self):
+        q = 889673
+        fq2 = Fq2(Fq(q))
+        gt = GT(fq2)
+        t2 = T2(fq2)
+        
+        # 1, -1, (0,-1)は特別な場合。
+        for x in [gt.one(),gt(1,1),gt(0,-1)]:
+            self.assertEqual(x.compress().decompress(),x)
+        self.assertTrue(gt.one().compress().is_one())
+
+        # T2の元はT2の元とのみ比較する。
+        z = fq2(5,7)**(q - 1)
+        x = gt(z.x(),z.y())
+        cx = x.compress()
+        self.assertFalse(cx == x)
+        self.assertFalse(x == cx)
+        self.assertTrue(cx != x)
+        self.assertTrue(x != cx)
+        self.assertEqual(len({cx,x.compress(),x}),2)
+        with self.assertRaises(AttributeError):
+            cx._m = 0
+        
+        for i in range(20):
+            z = fq2(randint(0,q-1),randint(0,q-1))**(q-1)
+            w = fq2(randint(0,q-1),randint(0,q-1))**(q-1)
+            x = gt(z.x(),z.y())
+            y = gt(w.x(),w.y())
+            cx = x.compress()
+            cy = y.compress()
+            self.assertEqual(cx.decompress(),x)
+            self.assertEqual(t2.from_bytes(cx.to_bytes()),cx)
+            self.assertEqual(len(cx.to_bytes()),3)
+            
+            self.assertEqual((cx*cy).decompress(),x*y)
+            self.assertEqual((cx/cy).decompress(),x/y)
+            self.assertEqual(cx.square().decompress(),x.square())
+            self.assertEqual(cx.conj().decompress(),x.conj())
+            self.assertTrue((cx*cx.conj()).is_one())
+            self.assertEqual(cx**i,(x**i).compress())
+            self.assertEqual(cx,x.compress())
+
 if __name__ == '__main__':
     unittest.main()
         
@@ -1,7 +1,9 @@
 from ibc.ibc import *
 from ibc.fq import Fq
+from ibc.pairing import PairingPool
 
 from random import randint
+from functools import partial
 
 import unittest
 
@@ -38,6 +40,139 @@ class TestIBC(unittest.TestCase):
             
             self.assertEqual(m,M)
 
+    def test_bytes(self):
+        ec,p,l = prepare(10**20,10**30)
+        s,pub = pub_keys(ec,p,l)
+        h1,priv = priv_keys(ec,s,l,"Alice@gmail.com")
+        for m in [b"",b"a",bytes(range(256))*4,bytearray(b"hello"),memoryview(b"world")]:
+            c1,c2 = enc(ec,m,pub,h1,p,l,pairing=modified_tate_pairing)
+            self.assertEqual(type(c2),bytes)
+            self.assertEqual(len(c2),len(m))
+            M = dec(ec,c1,c2,priv,l,pairing=modified_tate_pairing)
+            self.assertEqual(type(M),bytes)
+            self.assertEqual(M,bytes(m))
+            self.assertEqual(dec(ec,c1,bytearray(c2),priv,l,pairing=modified_tate_pairing),bytes(m))
+
+        # 文字列の場合はH2とのxor。
+        m = "0110"*10
+        c1,c2 = enc(ec,m,pub,h1,p,l,pairing=modified_tate_pairing)
+        w = modified_tate_pairing(ec,priv,c1,l)
+        self.assertEqual(c2,xor(m,H2(w,len(m))))
+        self.assertEqual(dec(ec,c1,c2,priv,l,pairing=modified_tate_pairing),m)
+        
+        self.assertEqual(xor("101","111"),"010")
+        self.assertEqual(xor("",""),"")
+        self.assertEqual(xor(b"\x0f\xf0",bytearray(b"\xff\xff")),b"\xf0\x0f")
+
+    def test_h2(self):
+        ec,p,l = prepare(10**20,10**30)
+        w = modified_tate_pairing(ec,p,p,l)
+        self.assertEqual(len(w.to_bytes()),2*((ec.modulo().bit_length() + 7)//8))
+        
+        # 長さに上限はなく、短い出力は長い出力の先頭と一致する。(XOF)
+        h = H2(w,10000)
+        self.assertEqual(len(h),10000)
+        self.assertNotEqual(h[:5000],"0"*5000)
+        for n in [1,7,8,9,255,256]:
+            self.assertEqual(H2(w,n),h[:n])
+        self.assertNotEqual(H2(w*w,256),h[:256])
+
+    def test_pairing(self):
+        ec,p,l = prepare(10**20,10**30)
+        a = randint(1,l-1)
+        b = randint(1,l-1)
+        pa = ec.mul(a,p)
+        pb = ec.mul(b,p)
+        tate_naf = partial(modified_tate_pairing,naf=True)
+        self.assertEqual(tate_naf(ec,pa,pb,l),modified_tate_pairing(ec,pa,pb,l))
+        for pairing in [modified_weil_pairing,modified_tate_pairing,tate_naf]:
+            e = pairing(ec,p,p,l)
+            self.assertNotEqual(e,1)
+            self.assertEqual(e**l,1)
+            self.assertEqual(pairing(ec,pa,pb,l),e**(a*b))
+            
+            n = randint(2,256)
+            m = "{:0256b}".format(randint(0,(1 << 256) - 1))[0:n]
+            s,pub = pub_keys(ec,p,l)
+            h1,priv = priv_keys(ec,s,l,"Alice@gmail.com")
+            c1,c2 = enc(ec,m,pub,h1,p,l,n,pairing=pairing)
+            self.assertEqual(dec(ec,c1,c2,priv,l,n,pairing=pairing),m)
+        
+    def test_prepared(self):
+        ec,p,l = prepare(10**20,10**30)
+        s,pub = pub_keys(ec,p,l)
+        h1,priv = priv_keys(ec,s,l,"Bob@yahoo.co.jp")
+        prepared_pub = prepare_pairing(ec,pub,l)
+        prepared_priv = prepare_pairing(ec,priv,l)
+        for pairing in [modified_tate_pairing,partial(modified_tate_pairing,naf=True)]:
+            self.assertEqual(pairing(ec,prepared_pub,h1,l),pairing(ec,h1,pub,l))
+            
+            n = 128
+            m = "{:0128b}".format(randint(0,(1 << 128) - 1))
+            c1,c2 = enc(ec,m,prepared_pub,h1,p,l,n,pairing=pairing)
+            self.assertEqual(dec(ec,c1,c2,priv,l,n,pairing=pairing),m)
+            c1,c2 = enc(ec,m,pub,h1,p,l,n,pairing=pairing)
+            self.assertEqual(dec(ec,c1,c2,prepared_priv,l,n,pairing=pairing),m)
+
+        # e(pub,h1)*e(-priv,p) = e(s*p,h1)/e(s*h1,p) = 1
+        self.assertEqual(modified_multi_pairing(ec,[(prepared_pub,h1),(ec.neg(priv),p)],l),1)
+
+        # Fq上の楕円曲線のPairingPoolは、Fq2上へ拡大した楕円曲線のMiller's algorithmにも使える。
+        with PairingPool(ec,l,modified_tate_pairing,processes=2) as pool:
+            self.assertEqual(pool.map([(h1,pub),(p,priv)]),[modified_tate_pairing(ec,h1,pub,l),modified_tate_pairing(ec,p,priv,l)])
+            self.assertEqual(modified_multi_pairing(ec,[(prepared_pub,h1),(ec.neg(priv),p)],l,pool),1)
+            w = modified_weil_pairing(ec,h1,pub,l,pool)
+            self.assertEqual(w**l,1)
+            self.assertEqual(w,modified_weil_pairing(ec,h1,pub,l))
+        
+    def test_encryptor(self):
+        ec,p,l = prepare(10**20,10**30)
+        s,pub = pub_keys(ec,p,l)
+        ids = ["Alice@gmail.com","Bob@yahoo.co.jp","Carol"]
+        privs = {id_name:priv_keys(ec,s,l,id_name)[1] for id_name in ids}
+        
+        encryptor = Encryptor(ec,p,prepare_pairing(ec,pub,l),l,pairing=modified_tate_pairing,maxsize=2,h1_maxsize=10)
+        n = 64
+        for id_name in ids + ids[::-1]:
+            m = "{:064b}".format(randint(0,(1 << 64) - 1))
+            c1,c2 = encryptor.enc(id_name,m,n)
+            self.assertEqual(dec(ec,c1,c2,privs[id_name],l,n,pairing=modified_tate_pairing),m)
+
+        self.assertEqual(len(encryptor.g_cache),2)
+        self.assertEqual(encryptor.g_cache.hits,2)
+        self.assertEqual(encryptor.g_cache.misses,4)
+        self.assertEqual(encryptor.g_cache.evictions,2)
+        self.assertEqual(encryptor.h1_cache.misses,3)
+
+        # バイト数による追い出し。
+        # テーブルのバイト数はIDごとに少し異なるので、最大のテーブル一つ分を上限にする。
+        maxbytes = max(FixedBasePow(encryptor.g_id(id_name),l.bit_length()).nbytes() for id_name in ids)
+        encryptor = Encryptor(ec,p,pub,l,pairing=modified_tate_pairing,maxbytes=maxbytes,window=4)
+        for id_name in ids:
+            c1,c2 = encryptor.enc(id_name,"0110",4)
+            self.assertEqual(dec(ec,c1,c2,privs[id_name],l,4,pairing=modified_tate_pairing),"0110")
+            self.assertEqual(len(encryptor.g_cache),1)
+        self.assertTrue(encryptor.g_cache.nbytes <= maxbytes)
+
+        # g_idを圧縮して保存する。(デフォルト)
+        encryptor = Encryptor(ec,p,pub,l,pairing=modified_tate_pairing)
+        for id_name in ids + ids:
+            c1,c2 = encryptor.enc(id_name,"0110",4)
+            self.assertEqual(dec(ec,c1,c2,privs[id_name],l,4,pairing=modified_tate_pairing),"0110")
+            self.assertEqual(encryptor.g_id(id_name),modified_tate_pairing(ec,encryptor.h1(id_name),pub,l))
+        self.assertEqual(encryptor.g_cache.hits,9)
+        
+    def test_base_field(self):
+        ec,p,l = prepare(10**20,10**30)
+        self.assertEqual(ec.ff.name(),"fq")
+        self.assertIsNone(ec.mul(l,p))
+        
+        # Fq上で計算してから持ち上げても、Fq2上で計算しても同じ点になる。
+        ext = ec.extension()
+        self.assertIs(ext,ec.extension())
+        k = randint(1,l-1)
+        self.assertEqual(ec.lift(ec.mul(k,p)),ext.mul(k,ec.lift(p)))
+
 if __name__ == '__main__':
     unittest.main()        
     
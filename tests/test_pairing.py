@@ -1,7 +1,31 @@
 from ibc.pairing import *
+from ibc.pairing import _final_exp
+
+from functools import partial
 
 import unittest
 
+def _supersingular():
+    """
+    テスト用のFq2上の楕円曲線 y^2 = x^3 + 1 (q = 6l - 1)、
+    位数lの点のリスト(座標はFqの元)、及びdistortion mapを返す。
+    """
+    l = 1009
+    q = 6*l - 1
+    fq2 = Fq2(Fq(q))
+    ec = EC(fq2.int_to_fq2(0),fq2.int_to_fq2(1),fq2)
+    omega = fq2(1,0)
+    
+    points = []
+    for y in range(2,30):
+        x = pow(y*y - 1,(2*q - 1)//3,q)
+        p = ec.point(fq2.int_to_fq2(x),fq2.int_to_fq2(y))
+        p = ec.mul(6,p)
+        if p is not None:
+            points.append(p)
+    phi = lambda p: ec.point(p.x*omega,p.y)
+    return ec,points,l,phi
+
 class TestPairing(unittest.TestCase):    
     def test_miller(self):
         p = 631
@@ -29,6 +53,64 @@ class TestPairing(unittest.TestCase):
         
         self.assertEqual((f_p_qs/f_p_s)/(f_q_ps/f_q_s),fq(242))
 
+    def test_miller_naf(self):
+        p = 631
+        fq = Fq(p)
+        ec = EC(fq(30),fq(34),fq)
+        p = ec.point(fq(36),fq(60))
+        q = ec.point(fq(121),fq(387))
+        s = ec.point(fq(0),fq(36))
+        for r in [ec.add(q,s),s,ec.sub(p,s),ec.neg(s)]:
+            self.assertEqual(miller_naf(ec,p,5,r),miller(ec,p,5,r))
+            self.assertEqual(miller_naf(ec,q,5,r),miller(ec,q,5,r))
+
+    def test_miller_projective(self):
+        ec,points,l,phi = _supersingular()
+        for p,q in zip(points,points[1:]):
+            for m in [l,l-1,12345]:
+                self.assertEqual(miller(ec,p,m,phi(q)),miller_affine(ec,p,m,phi(q)))
+                
+    def test_miller_reduced(self):
+        ec,points,l,phi = _supersingular()
+        for p,q in zip(points,points[1:]):
+            r = phi(q)
+            t = _final_exp(ec,miller(ec,p,l,r),l)
+            self.assertNotEqual(t,1)
+            self.assertEqual(_final_exp(ec,miller_reduced(ec,p,l,r),l),t)
+            self.assertEqual(_final_exp(ec,miller_reduced(ec,p,l,r,naf=True),l),t)
+            self.assertEqual(tate_pairing(ec,p,r,l),t)
+
+    def test_multi_pairing(self):
+        ec,points,l,phi = _supersingular()
+        pairs = [(p,phi(q)) for p,q in zip(points,points[3:])]
+        t = 1
+        for p,q in pairs:
+            t = t*tate_pairing(ec,p,q,l)
+        self.assertEqual(multi_pairing(ec,pairs,l),t)
+        self.assertEqual(multi_pairing(ec,pairs,l,naf=False),t)
+        
+        prepared = [(PreparedPoint(ec,p,l,naf=True),q) for p,q in pairs]
+        self.assertEqual(multi_pairing(ec,prepared[:2] + pairs[2:],l),t)
+
+    def test_pairing_pool(self):
+        ec,points,l,phi = _supersingular()
+        pairs = [(p,phi(q)) for p in points for q in points[:3]]
+        expected = [tate_pairing(ec,p,q,l) for p,q in pairs]
+        with PairingPool(ec,l,processes=2) as pool:
+            self.assertEqual(pool.map(pairs),expected)
+            self.assertEqual(pool.map(pairs[::-1]),expected[::-1])
+            self.assertEqual(pool.map([]),[])
+        with PairingPool(ec,l,partial(tate_pairing,naf=True),processes=2,chunksize=1) as pool:
+            self.assertEqual(pool.map(pairs[:4]),expected[:4])
+
+            # 一つのPairingの中のMiller's algorithmの並列化。
+            p,q = points[0],phi(points[1])
+            s = ec.add(points[2],phi(points[3]))
+            self.assertEqual(weil_pairing(ec,p,q,s,l,pool),weil_pairing(ec,p,q,s,l))
+            prepared = [(PreparedPoint(ec,p,l,naf=True),q) for p,q in pairs[:2]]
+            self.assertEqual(multi_pairing(ec,prepared + pairs[2:7],l,pool=pool),
+                             multi_pairing(ec,prepared + pairs[2:7],l))
+
 if __name__ == '__main__':
     unittest.main()        
     